@@ -1,94 +1,178 @@
-import qutip
 import numpy as np
-import pickle as pkl
 import os
+import sys
+import matplotlib
+from artifact import read_artifact
+from searchpath import search_here_last
+
+# Draw to files only, without an interactive window
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import seaborn
 
-# Navigate to the directory containing the output of all the programs
-os.chdir('output')
+# Number of time steps in the oscillation drawn on the Bloch sphere
+n_tsteps_one_oscillation = 32
 
-# Open the files containing the expectation values
-inputfile_sigmax = open('statistics/exp_sigmax.pkl', 'rb')
-inputfile_sigmay = open('statistics/exp_sigmay.pkl', 'rb')
-inputfile_sigmaz = open('statistics/exp_sigmaz.pkl', 'rb')
+# The figures made by this process, kept to be reused by every plot
+templates = {}
 
-# Read the state vector at different tims
-exp_sigmax = pkl.load(inputfile_sigmax)
-exp_sigmay = pkl.load(inputfile_sigmay)
-exp_sigmaz = pkl.load(inputfile_sigmaz)
+def exp_sigma_template():
+    r'''
+    Returns the figure the expectation values are plotted on
 
-# Close the input file
-inputfile_sigmax.close()
-inputfile_sigmay.close()
-inputfile_sigmaz.close()
+    The figure, its axes, their labels and the (empty) lines are made
+    once, the first time this is called. Later plots only change the
+    data of the lines.
 
-# Open the file containing the results of the simulation
-inputfile = open('simulation/psi_t.pkl', 'rb')
+    Returns
+    -------
+    (fig, ax, lines): The matplotlib figure, its axes and the lines of
+                      sigmax, sigmay and sigmaz
+    '''
 
-# Read the state vector at different tims
-psi_t = pkl.load(inputfile)
+    if 'exp_sigma' not in templates:
+        fig = plt.figure()
+        ax = fig.add_axes([0, 0, 1, 1])
+        lines = []
+        for color, label in [('b', '$\\langle\\sigma_x\\rangle$'),
+                             ('r', '$\\langle\\sigma_y\\rangle$'),
+                             ('g', '$\\langle\\sigma_z\\rangle$')]:
+            line, = ax.plot([], [], color=color, ls='--', marker='o', clip_on=False, label=label)
+            lines.append(line)
 
-# Close the input file
-inputfile.close()
+        # Make some space
+        ax.set_ylim([-1, 1])
 
-# Next we read the time steps
+        # Show the legend, add axis titles
+        ax.set_xlabel('Time, $t / \\frac{1}{\\omega}$')
+        ax.set_ylabel('Expecation value of $\\sigma$, $\\langle\\sigma\\rangle / \\frac{\hbar}{2}$')
+        ax.legend(loc='best', frameon=True, fancybox=True)
 
-# Open the file containing the time steps
-inputfile_tsteps = open('tsteps.pkl', 'rb')
+        templates['exp_sigma'] = (fig, ax, lines)
 
-# Read the time steps
-tsteps = pkl.load(inputfile_tsteps)
+    return templates['exp_sigma']
 
-# Close the file containing the time steps
-inputfile_tsteps.close()
+def plot_exp_sigma(tsteps, exp_sigmax, exp_sigmay, exp_sigmaz, path):
+    r'''
+    Plots the expectation values of sigmax, sigmay and sigmaz against time
 
-# Now to the actual graphics.
+    Inputs
+    ------
+    tsteps: A numpy array of the times
 
-# Create the directory for storing graphics
-if not os.path.isdir('graphics'):
-    os.mkdir('graphics')
+    exp_sigmax, exp_sigmay, exp_sigmaz: Numpy arrays of the expectation values at those times
 
-# Move to the directory for storing graphics
-os.chdir('graphics')
+    path: The file to save the plot to
 
-# First we plot the expectation values of
-# sigmax, sigmay and sigmaz
+    Returns
+    -------
+    None. Writes path.
+    '''
 
-fig = plt.figure()
-ax =  fig.add_axes([0, 0, 1, 1])
-ax.plot(tsteps, exp_sigmax, color='b', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_x\\rangle$')
-ax.plot(tsteps, exp_sigmay, color='r', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_y\\rangle$')
-ax.plot(tsteps, exp_sigmaz, color='g', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_z\\rangle$')
+    fig, ax, lines = exp_sigma_template()
 
-# Make some space
-ax.set_ylim([-1, 1])
+    for line, values in zip(lines, [exp_sigmax, exp_sigmay, exp_sigmaz]):
+        line.set_data(tsteps, values)
 
-# Show the legend, add axis titles
-ax.set_xlabel('Time, $t / \\frac{1}{\\omega}$')
-ax.set_ylabel('Expecation value of $\\sigma$, $\\langle\\sigma\\rangle / \\frac{\hbar}{2}$')
-ax.legend(loc='best', frameon=True, fancybox=True)
+    # The time axis fits the new data, the other stays at [-1, 1]
+    ax.relim()
+    ax.autoscale_view(scaley=False)
 
-# Save the plot
-fig.savefig('exp_sigma.pdf', filetype='pdf', bbox_inches='tight')
-plt.close()
+    # Save the plot
+    fig.savefig(path, bbox_inches='tight')
 
-# Next we plot four steps in the rotation of the Bloch vector
-# using the functionality provided by the qutip library
+def bloch_template():
+    r'''
+    Returns the qutip Bloch sphere the state is drawn on
 
-n_tsteps_one_oscillation = 32
-sphere = qutip.Bloch()
-sphere.sphere_alpha = 0.0
-sphere.vector_color = seaborn.color_palette('husl', n_colors=n_tsteps_one_oscillation)
+    The sphere (and the matplotlib figure it draws on) is made once, the
+    first time this is called, and cleared by later plots.
+    '''
+
+    # qutip takes long to import, and is only needed for this figure
+    search_here_last()
+    import qutip
+
+    if 'bloch' not in templates:
+        sphere = qutip.Bloch()
+        sphere.sphere_alpha = 0.0
+        templates['bloch'] = sphere
+
+    return templates['bloch']
+
+def plot_bloch(exp_sigmax, exp_sigmay, exp_sigmaz, psi_t, path):
+    r'''
+    Draws one oscillation of the Bloch vector on the Bloch sphere,
+    using the functionality provided by the qutip library
+
+    Inputs
+    ------
+    exp_sigmax, exp_sigmay, exp_sigmaz: Numpy arrays of the expectation values
+                                        (the Bloch vector) at each time
+
+    psi_t: A numpy array whose rows are the state vector at each time
+
+    path: The file to save the plot to
+
+    Returns
+    -------
+    None. Writes path.
+    '''
+
+    search_here_last()
+    import qutip
+    import seaborn
+
+    sphere = bloch_template()
+    sphere.clear()
+    sphere.vector_color = seaborn.color_palette('husl', n_colors=n_tsteps_one_oscillation)
+
+    # Mark the initial Bloch vector for reference
+    a_0 = [exp_sigmax[0], exp_sigmay[0], exp_sigmaz[0]]
+    sphere.add_points(a_0)
+
+    # Mark the next Bloch vector for reference of direction of motion
+    a_1 = [exp_sigmax[1], exp_sigmay[1], exp_sigmaz[1]]
+    sphere.add_points(a_1)
+
+    sphere.add_states([qutip.Qobj(psi[:, np.newaxis]) for psi in psi_t[:n_tsteps_one_oscillation]])
+    sphere.make_sphere()
+    sphere.fig.savefig(path, bbox_inches='tight')
+
+def main():
+    # The figures to make are given on the command line, e.g.
+    # `python graphics.py exp_sigma'. By default both are made.
+    figures = sys.argv[1:] or ['exp_sigma', 'bloch']
+
+    # Navigate to the directory containing the output of all the programs
+    os.chdir('output')
+
+    # Read the expectation values
+    attrs, arrays = read_artifact('statistics/exp_sigma.npa')
+    exp_sigmax = arrays['exp_sigmax']
+    exp_sigmay = arrays['exp_sigmay']
+    exp_sigmaz = arrays['exp_sigmaz']
+
+    # Read the time steps and the state vector at different
+    # times from the results of the simulation. The file is
+    # memory-mapped, so only the parts we use are read.
+    attrs, arrays = read_artifact('simulation/psi_t.npa', names=['tsteps', 'psi_t'])
+    tsteps = arrays['tsteps']
+    psi_t = arrays['psi_t']
+
+    # Now to the actual graphics.
+
+    # Create the directory for storing graphics
+    if not os.path.isdir('graphics'):
+        os.mkdir('graphics')
 
-# Mark the initial Bloch vector for reference
-a_0 = [exp_sigmax[0], exp_sigmay[0], exp_sigmaz[0]]
-sphere.add_points(a_0)
+    # First we plot the expectation values of
+    # sigmax, sigmay and sigmaz
+    if 'exp_sigma' in figures:
+        plot_exp_sigma(tsteps, exp_sigmax, exp_sigmay, exp_sigmaz, 'graphics/exp_sigma.pdf')
 
-# Mark the next Bloch vector for reference of direction of motion
-a_1 = [exp_sigmax[1], exp_sigmay[1], exp_sigmaz[1]]
-sphere.add_points(a_1)
+    # Next we plot four steps in the rotation of the Bloch vector
+    if 'bloch' in figures:
+        plot_bloch(exp_sigmax, exp_sigmay, exp_sigmaz, psi_t, 'graphics/bloch.pdf')
 
-sphere.add_states(psi_t.states[:n_tsteps_one_oscillation])
-sphere.make_sphere()
-plt.savefig('bloch.pdf', filetype='pdf', bbox_inches='tight')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import numpy as np
+
+def is_time_independent(H):
+    r'''
+    Checks whether a Hamiltonian is constant in time
+
+    Inputs
+    ------
+    H: A Hamiltonian, in any form accepted by qutip.mesolve
+
+    Returns
+    -------
+    True if H is a single operator (a qutip Qobj or a numpy array),
+    False for the list and function forms of time-dependent Hamiltonians
+    '''
+
+    if isinstance(H, np.ndarray):
+        return True
+
+    import qutip
+    return isinstance(H, qutip.Qobj)
+
+def as_array(x):
+    r'''
+    Converts a qutip Qobj (or anything array-like) to a complex numpy array
+    '''
+
+    if hasattr(x, 'full'):
+        x = x.full()
+
+    return np.asarray(x, dtype=complex)
+
+def qubit_states(theta, phi):
+    r'''
+    Builds pure qubit states from the angles of their Bloch vectors
+
+    Inputs
+    ------
+    theta: The polar angle(s) of the Bloch vector. A float or a numpy array of length N
+
+    phi: The azimuthal angle(s) of the Bloch vector, of the same shape as theta
+
+    Returns
+    -------
+    psi: A complex numpy array of shape (N, 2) (or (2,) for a single state)
+         whose rows are cos(theta/2)|0> + exp(i phi) sin(theta/2)|1>
+    '''
+
+    theta = np.asarray(theta, dtype=float)
+    phi = np.asarray(phi, dtype=float)
+
+    return np.stack([np.cos(theta/2), np.exp(1j*phi)*np.sin(theta/2)], axis=-1)
+
+def mesolve_states(H, psi_0, tsteps, c_ops=None):
+    r'''
+    Computes the states at the given times with the qutip ODE solver
+
+    This is the fallback of propagate, for Hamiltonians which depend on
+    time or when there are collapse operators. Inputs and outputs are as
+    for propagate. For a composite system, pass psi_0 as a qutip ket, so
+    that it has the same dimensions as H.
+    '''
+
+    import qutip
+
+    if not isinstance(psi_0, qutip.Qobj):
+        psi_0 = as_array(psi_0)
+        if psi_0.ndim == 2:
+            # An ensemble of initial states, solved one at a time
+            return np.array([mesolve_states(H, psi, tsteps, c_ops) for psi in psi_0])
+        psi_0 = qutip.Qobj(psi_0[:, np.newaxis])
+
+    result = qutip.mesolve(H, psi_0, tsteps, c_ops=c_ops or [])
+    psi_t = np.array([as_array(state) for state in result.states])
+
+    # Kets come out as columns
+    if psi_t.shape[-1] == 1:
+        psi_t = psi_t[:, :, 0]
+
+    return psi_t
+
+def propagate(H, psi_0, tsteps, c_ops=None):
+    r'''
+    Computes the state vector at the given times, starting from psi_0
+
+    For a time-independent Hamiltonian, the Schrodinger equation is
+    solved exactly. H is diagonalized once, H = V E V^dagger, and
+        psi(t) = V exp(-i E t) V^dagger psi_0
+    is evaluated for all the times (and all the initial states, for an
+    ensemble) in one vectorized operation. If H is time-dependent, or
+    there are collapse operators, we fall back on the qutip ODE solver,
+    qutip.mesolve (see mesolve_states).
+
+    Inputs
+    ------
+    H: The Hamiltonian. A qutip Qobj or numpy array, or a time-dependent
+       Hamiltonian in any form accepted by qutip.mesolve
+
+    psi_0: The initial state vector. A qutip ket or a numpy array of length dim.
+           For an ensemble of initial states, a numpy array of shape (N, dim)
+           whose rows are the state vectors.
+
+    tsteps: A numpy array of the times at which to compute the state
+
+    c_ops: A list of collapse operators, passed on to qutip.mesolve. Optional
+
+    Returns
+    -------
+    psi_t: A complex numpy array of shape (n_tsteps, dim) whose j^th row is
+           the state vector at time tsteps[j]. If there are collapse operators,
+           the states are density matrices and psi_t has shape (n_tsteps, dim, dim).
+           For an ensemble, psi_t has an extra first axis of length N.
+    '''
+
+    if c_ops or not is_time_independent(H):
+        return mesolve_states(H, psi_0, tsteps, c_ops)
+
+    # A qutip ket is a column, flatten it
+    psi_0 = as_array(psi_0)
+    if psi_0.ndim == 2 and psi_0.shape[1] == 1:
+        psi_0 = psi_0[:, 0]
+
+    # Diagonalize the Hamiltonian once
+    energies, vectors = np.linalg.eigh(as_array(H))
+
+    # The initial state(s) in the eigenbasis of H
+    coefficients = np.dot(psi_0, vectors.conj())
+
+    # Each eigen-component picks up a phase exp(-i E t), for all times
+    # at once, and we transform back from the eigenbasis
+    phases = np.exp(-1j * np.outer(tsteps, energies))
+    if psi_0.ndim == 1:
+        psi_t = np.dot(phases * coefficients, vectors.T)
+    else:
+        psi_t = np.einsum('tk,nk,ik->nti', phases, coefficients, vectors)
+
+    return psi_t
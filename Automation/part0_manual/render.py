@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import json
+import glob
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from searchpath import search_here_last
+
+# The figures made for every point of a sweep
+FIGURES = ['exp_sigma', 'bloch']
+
+# The fingerprints of the data the figures were made from
+# are kept in this file, in the graphics output directory
+STATE_FILE = 'render.json'
+
+def point_names(output):
+    r'''
+    Lists the points of a sweep (see sweep.py) which have statistics
+
+    Inputs
+    ------
+    output: The output directory of the sweep
+
+    Returns
+    -------
+    names: A sorted list of the names of the points
+    '''
+
+    paths = glob.glob(os.path.join(output, 'statistics', '*', 'exp_sigma.npa'))
+    return sorted(os.path.basename(os.path.dirname(path)) for path in paths)
+
+def point_inputs(output, name):
+    r'''
+    Returns the paths of the array files the figures of a point are made from
+    '''
+
+    return [os.path.join(output, 'simulation', name, 'psi_t.npa'),
+            os.path.join(output, 'statistics', name, 'exp_sigma.npa')]
+
+def fingerprint(paths):
+    r'''
+    Hashes the contents of some files, and of the code drawing the figures
+
+    Inputs
+    ------
+    paths: A list of paths
+
+    Returns
+    -------
+    key: A hexadecimal string
+    '''
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = [os.path.join(here, name) for name in ['graphics.py', 'artifact.py', 'searchpath.py']]
+
+    h = hashlib.sha256()
+    for path in code + paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+
+    return h.hexdigest()
+
+def render_point(output, name, figures):
+    r'''
+    Makes the figures of one point of a sweep
+
+    This runs in a worker process. The figures are drawn on the
+    templates of graphics.py, which every worker makes only once.
+    The figures are written to output/graphics/<name>/.
+
+    Inputs
+    ------
+    output: The absolute path of the output directory
+
+    name: The name of the point
+
+    figures: A list of the figures to make, from FIGURES
+
+    Returns
+    -------
+    (name, elapsed): The name of the point and the time taken, in seconds
+    '''
+
+    from artifact import read_artifact
+    import graphics
+
+    start = time.time()
+
+    simulation_path, statistics_path = point_inputs(output, name)
+    directory = os.path.join(output, 'graphics', name)
+    os.makedirs(directory, exist_ok=True)
+
+    attrs, arrays = read_artifact(statistics_path)
+    exp_sigmax = arrays['exp_sigmax']
+    exp_sigmay = arrays['exp_sigmay']
+    exp_sigmaz = arrays['exp_sigmaz']
+
+    attrs, arrays = read_artifact(simulation_path, names=['tsteps', 'psi_t'])
+
+    if 'exp_sigma' in figures:
+        graphics.plot_exp_sigma(arrays['tsteps'], exp_sigmax, exp_sigmay, exp_sigmaz,
+                                os.path.join(directory, 'exp_sigma.pdf'))
+    if 'bloch' in figures:
+        graphics.plot_bloch(exp_sigmax, exp_sigmay, exp_sigmaz, arrays['psi_t'],
+                            os.path.join(directory, 'bloch.pdf'))
+
+    return name, time.time() - start
+
+def read_state(output):
+    path = os.path.join(output, 'graphics', STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_state(output, state):
+    path = os.path.join(output, 'graphics', STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def parse_args():
+    r'''
+    Parses the command line arguments of the renderer
+
+    Returns
+    -------
+    args: An argparse.Namespace holding the options
+    '''
+
+    parser = argparse.ArgumentParser(description='Makes the figures of every point of a '
+                                                 'sweep, in a pool of processes')
+    parser.add_argument('--figures', nargs='+', choices=FIGURES, default=FIGURES,
+                        help='Figures to make (default: all)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: the number of CPUs)')
+    parser.add_argument('--output', default='output',
+                        help='Output directory of the sweep (default: output)')
+    parser.add_argument('--force', action='store_true',
+                        help='Make every figure, even if its data has not changed')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    output = os.path.abspath(args.output)
+    os.makedirs(os.path.join(output, 'graphics'), exist_ok=True)
+
+    # The workers import graphics.py from this directory, whatever
+    # the working directory, and seaborn (see searchpath.py)
+    search_here_last()
+
+    # A point is skipped if its data, the code and the figures
+    # asked for are the same as when its figures were last made,
+    # and the figures are still there
+    state = read_state(output)
+    keys = {}
+    todo = []
+    for name in point_names(output):
+        keys[name] = {'data': fingerprint(point_inputs(output, name)),
+                      'figures': sorted(args.figures)}
+        outputs_exist = all(os.path.exists(os.path.join(output, 'graphics', name, figure + '.pdf'))
+                            for figure in args.figures)
+        if args.force or not outputs_exist or state.get(name) != keys[name]:
+            todo.append(name)
+
+    print('{0} of {1} points to render'.format(len(todo), len(keys)))
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(render_point, output, name, args.figures) for name in todo]
+
+        for done, future in enumerate(as_completed(futures), 1):
+            name, elapsed = future.result()
+            print('[{0}/{1}] {2}: {3:.3f} s'.format(done, len(todo), name, elapsed))
+            sys.stdout.flush()
+
+            # A point is only recorded once its figures are written
+            state[name] = keys[name]
+            write_state(output, state)
+
+    print('Rendered {0} points in {1:.2f} s'.format(len(todo), time.time() - start))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+def search_here_last():
+    r'''
+    Moves the directory of the programs to the end of sys.path
+
+    The statistics.py of the programs has the name of a standard
+    library module, which libraries such as seaborn import. With this
+    directory searched last they get the standard module, and the other
+    modules of the programs, whose names are not taken, are still found.
+    This is called before importing seaborn, and by the programs which
+    start other processes importing it.
+    '''
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != here] + [here]
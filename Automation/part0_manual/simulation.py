@@ -1,77 +1,135 @@
-import qutip
 import numpy as np
-import pickle as pkl
 import os
+from propagation import propagate, qubit_states
+from artifact import write_artifact
+from observables import sigmax, sigmaz
+
+def hamiltonian(omega=1., tilt=0.):
+    r'''
+    The Hamiltonian of a spin in a magnetic field
+
+    Inputs
+    ------
+    omega: The strength of the field. Optional
 
-# Hamiltonian
-H = -qutip.sigmaz()
+    tilt: The angle between the field and the z axis, in the x-z plane. Optional
 
-# Number of oscillations
-n_oscillations = 4
+    Returns
+    -------
+    H: A numpy array (so qutip need not be imported). The default is -sigmaz.
+    '''
 
-# Number of time steps at which to store results
-n_tsteps = 128
+    return -omega * (np.sin(tilt) * sigmax + np.cos(tilt) * sigmaz)
 
-# List of times for which the solver should store the state vector
-tsteps = np.linspace(0, n_oscillations*np.pi, n_tsteps)
+def simulate(omega=1., tilt=0., n_oscillations=4, n_tsteps=128, n_states=1, seed=1):
+    r'''
+    Computes the time evolution of an ensemble of random initial states
 
-# Get a random pure qubit state, parameterized by
-# the polar angle theta of the Bloch vector and the
-# azimuthal angle phi of the Bloch vector
-np.random.seed(1)
-theta = np.random.uniform(low=0, high=np.pi)
-phi = np.random.uniform(low=0, high=2*np.pi)
+    Inputs
+    ------
+    omega, tilt: The parameters of the Hamiltonian (see hamiltonian). Optional
 
-# The state is defined using the qutip library's
-# basis states for qubits
-psi_0 = np.cos(theta/2) * qutip.basis(2, 0) + np.exp(1j*phi)*np.sin(theta/2) * qutip.basis(2, 1)
+    n_oscillations: The number of oscillations (for omega = 1) to simulate. Optional
 
-# Solve for the state vector at different times
-# using the qutip library.
-psi_t = qutip.mesolve(H, psi_0, tsteps, [], [])
+    n_tsteps: The number of time steps at which to store results. Optional
 
-# Now, we will save the output to a file
+    n_states: The number of random initial states in the ensemble. Only the first
+              is used by statistics.py and graphics.py. Optional
 
-# Create simulation output directory
-if not os.path.isdir('output'):
-    os.mkdir('output')
+    seed: The seed of the random initial states. Optional
 
-# Navigate to the location where to store output
-os.chdir('output')
+    Returns
+    -------
+    (H, tsteps, psi_t_ensemble): The Hamiltonian, the times, and a numpy array
+                                 of shape (n_states, n_tsteps, 2) holding the
+                                 state vectors of each state at each time
+    '''
 
-# First we will save parameters of the simulation
+    # Hamiltonian
+    H = hamiltonian(omega, tilt)
 
-# Open output file for saving the Hamiltonian
-outputfile = open('hamiltonian.pkl', 'wb')
+    # List of times for which the solver should store the state vector
+    tsteps = np.linspace(0, n_oscillations*np.pi, n_tsteps)
 
-# Save to output file
-pkl.dump(H, file=outputfile)
+    # Get random pure qubit states, parameterized by
+    # the polar angle theta of the Bloch vector and the
+    # azimuthal angle phi of the Bloch vector.
+    # Each row of angles holds (theta, phi) for one state.
+    random_state = np.random.RandomState(seed)
+    angles = random_state.uniform(low=[0, 0], high=[np.pi, 2*np.pi], size=(n_states, 2))
+    theta = angles[:, 0]
+    phi = angles[:, 1]
 
-# Close output file
-outputfile.close()
+    # The states are cos(theta/2)|0> + exp(i phi) sin(theta/2)|1>,
+    # one per row of the (n_states, 2) array psi_0_ensemble
+    psi_0_ensemble = qubit_states(theta, phi)
 
-# Open output file for saving the time steps
-outputfile = open('tsteps.pkl', 'wb')
+    # Solve for the state vectors at different times.
+    # The Hamiltonian does not depend on time, so the
+    # state is exp(-iHt) psi_0, which propagate() computes
+    # for all the times and all the initial states at once
+    # by diagonalizing H. psi_t_ensemble has shape
+    # (n_states, n_tsteps, 2).
+    psi_t_ensemble = propagate(H, psi_0_ensemble, tsteps)
 
-# Save to output file
-pkl.dump(tsteps, file=outputfile)
+    return H, tsteps, psi_t_ensemble
 
-# Close output file
-outputfile.close()
+def save(path, H, tsteps, psi_t_ensemble, attrs=None):
+    r'''
+    Saves the output of simulate to the array file path (see artifact.py)
 
+    The first state of the ensemble is the one we look at in detail,
+    and it is saved on its own, as psi_t. The whole ensemble is only
+    saved (as psi_t_ensemble) if there is more than the one state.
+    '''
 
-# Create simulation output directory
-if not os.path.isdir('simulation'):
-    os.mkdir('simulation')
+    # The parameters of the simulation and the state vectors
+    # are saved together in one array file, from which each
+    # array can be read back on its own.
+    arrays = {'hamiltonian': H,
+              'tsteps': tsteps,
+              'psi_t': psi_t_ensemble[0]}
+    if len(psi_t_ensemble) > 1:
+        arrays['psi_t_ensemble'] = psi_t_ensemble
 
-# Move to simulation output directory
-os.chdir('simulation')
+    write_artifact(path, arrays, attrs=attrs)
 
-# Open output file for saving the state vector
-outputfile = open('psi_t.pkl', 'wb')
+def main():
+    # Number of oscillations
+    n_oscillations = 4
 
-# Save to output file
-pkl.dump(psi_t, file=outputfile)
+    # Number of time steps at which to store results
+    n_tsteps = 128
 
-# Close output file
-outputfile.close()
+    # Number of random initial states in the ensemble. The later
+    # programs only use the first, so it is the only one here
+    n_states = 1
+
+    H, tsteps, psi_t_ensemble = simulate(n_oscillations=n_oscillations,
+                                         n_tsteps=n_tsteps,
+                                         n_states=n_states,
+                                         seed=1)
+
+    # Now, we will save the output to a file
+
+    # Create simulation output directory
+    if not os.path.isdir('output'):
+        os.mkdir('output')
+
+    # Navigate to the location where to store output
+    os.chdir('output')
+
+    # Create simulation output directory
+    if not os.path.isdir('simulation'):
+        os.mkdir('simulation')
+
+    # Move to simulation output directory
+    os.chdir('simulation')
+
+    save('psi_t.npa', H, tsteps, psi_t_ensemble,
+         attrs={'n_oscillations': n_oscillations,
+                'n_tsteps': n_tsteps,
+                'n_states': n_states})
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,49 @@
-import qutip
-import numpy as np
-import pickle as pkl
 import os
-
-# Navigate to the directory containing the output of all the programs
-os.chdir('output')
-
-# Open the file containing the results of the simulation
-inputfile = open('simulation/psi_t.pkl', 'rb')
-
-# Read the state vector at different tims
-psi_t = pkl.load(inputfile)
-
-# Close the input file
-inputfile.close()
-
-
-# Using functionality of the qutip library, we compute expectation
-# values of sigmax, sigmay and sigmaz
-exp_sigmax = qutip.expect(qutip.sigmax(), psi_t.states)
-exp_sigmay = qutip.expect(qutip.sigmay(), psi_t.states)
-exp_sigmaz = qutip.expect(qutip.sigmaz(), psi_t.states)
-
-# Now, we will save the expectation values to files
-
-# Create statistics output directory
-if not os.path.isdir('statistics'):
-    os.mkdir('statistics')
-
-# Move to the statistics output directory
-os.chdir('statistics')
-
-# Open output file for saving the expectation values
-outputfile_sigmax = open('exp_sigmax.pkl', 'wb')
-outputfile_sigmay = open('exp_sigmay.pkl', 'wb')
-outputfile_sigmaz = open('exp_sigmaz.pkl', 'wb')
-
-# Save to output file
-pkl.dump(exp_sigmax, file=outputfile_sigmax)
-pkl.dump(exp_sigmay, file=outputfile_sigmay)
-pkl.dump(exp_sigmaz, file=outputfile_sigmaz)
-
-# Close output file
-outputfile_sigmax.close()
-outputfile_sigmay.close()
-outputfile_sigmaz.close()
-
+from observables import bloch_vector
+from artifact import read_artifact, write_artifact
+
+def statistics(simulation_path, statistics_path):
+    r'''
+    Computes the expectation values of the Pauli operators from the output of simulation.py
+
+    Inputs
+    ------
+    simulation_path: The path of the array file written by simulation.py
+
+    statistics_path: The path of the array file to write the expectation values to
+
+    Returns
+    -------
+    None. Writes statistics_path.
+    '''
+
+    # Read the state vector at different times from the
+    # file containing the results of the simulation. Only
+    # psi_t is read, not the rest of the file.
+    attrs, arrays = read_artifact(simulation_path, names=['psi_t'])
+    psi_t = arrays['psi_t']
+
+    # The state vectors are the rows of psi_t.
+    # We compute the expectation values of sigmax, sigmay
+    # and sigmaz (the Bloch vector) for all the time steps
+    # at once, in a single vectorized operation.
+    exp_sigmax, exp_sigmay, exp_sigmaz = bloch_vector(psi_t)
+
+    # Save the expectation values together in one array file
+    write_artifact(statistics_path,
+                   {'exp_sigmax': exp_sigmax,
+                    'exp_sigmay': exp_sigmay,
+                    'exp_sigmaz': exp_sigmaz})
+
+def main():
+    # Navigate to the directory containing the output of all the programs
+    os.chdir('output')
+
+    # Create statistics output directory
+    if not os.path.isdir('statistics'):
+        os.mkdir('statistics')
+
+    statistics('simulation/psi_t.npa', 'statistics/exp_sigma.npa')
+
+if __name__ == '__main__':
+    main()
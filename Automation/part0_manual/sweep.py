@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import json
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# The parameters of a point of the sweep, in the order
+# in which they vary in the grid
+PARAMETERS = ['omega', 'tilt', 'n_oscillations', 'n_tsteps', 'seed']
+
+def sweep_points(args):
+    r'''
+    Lists the points of the sweep, the product of the grids of all the parameters
+
+    Inputs
+    ------
+    args: The argparse.Namespace returned by parse_args
+
+    Returns
+    -------
+    points: A list of dictionaries, one per point, holding its name
+            (the directory its output is written to) and its parameters
+    '''
+
+    grids = [args.omega, args.tilt, args.n_oscillations, args.n_tsteps, args.seed]
+
+    points = []
+    for index, values in enumerate(itertools.product(*grids)):
+        point = dict(zip(PARAMETERS, values))
+        point['n_states'] = args.n_states
+        point['name'] = 'point-{0:04d}'.format(index)
+        points.append(point)
+
+    return points
+
+def run_point(point, output):
+    r'''
+    Runs simulation and statistics for one point of the sweep
+
+    This runs in a worker process. The results are written to
+    output/simulation/<name>/psi_t.npa and
+    output/statistics/<name>/exp_sigma.npa.
+
+    Inputs
+    ------
+    point: A dictionary returned by sweep_points
+
+    output: The absolute path of the output directory
+
+    Returns
+    -------
+    (name, timings): The name of the point, and a dictionary holding
+                     the time in seconds taken by each stage
+    '''
+
+    from simulation import simulate, save
+    from statistics import statistics
+
+    simulation_dir = os.path.join(output, 'simulation', point['name'])
+    statistics_dir = os.path.join(output, 'statistics', point['name'])
+    for directory in [simulation_dir, statistics_dir]:
+        os.makedirs(directory, exist_ok=True)
+
+    params = dict((key, point[key]) for key in PARAMETERS + ['n_states'])
+    simulation_path = os.path.join(simulation_dir, 'psi_t.npa')
+    statistics_path = os.path.join(statistics_dir, 'exp_sigma.npa')
+
+    timings = {}
+
+    start = time.time()
+    H, tsteps, psi_t_ensemble = simulate(**params)
+    save(simulation_path, H, tsteps, psi_t_ensemble, attrs=params)
+    timings['simulation'] = time.time() - start
+
+    start = time.time()
+    statistics(simulation_path, statistics_path)
+    timings['statistics'] = time.time() - start
+
+    return point['name'], timings
+
+def write_index(output, points):
+    r'''
+    Writes output/sweep.json, listing the parameters of every point of the sweep
+    '''
+
+    path = os.path.join(output, 'sweep.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(points, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def parse_args():
+    r'''
+    Parses the command line arguments of the sweep
+
+    Returns
+    -------
+    args: An argparse.Namespace holding the options
+    '''
+
+    parser = argparse.ArgumentParser(description='Runs simulation and statistics over a grid '
+                                                 'of parameters, in a pool of processes')
+    parser.add_argument('--omega', type=float, nargs='+', default=[1.],
+                        help='Strengths of the magnetic field (default: 1)')
+    parser.add_argument('--tilt', type=float, nargs='+', default=[0.],
+                        help='Angles between the field and the z axis (default: 0)')
+    parser.add_argument('--n-oscillations', type=int, nargs='+', default=[4],
+                        help='Numbers of oscillations to simulate (default: 4)')
+    parser.add_argument('--n-tsteps', type=int, nargs='+', default=[128],
+                        help='Numbers of time steps at which to store results (default: 128)')
+    parser.add_argument('--seed', type=int, nargs='+', default=[1],
+                        help='Seeds of the random initial states (default: 1)')
+    parser.add_argument('--n-states', type=int, default=1,
+                        help='Number of random initial states at every point. Only the first '
+                             'is used by the statistics and the figures (default: 1)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: the number of CPUs)')
+    parser.add_argument('--output', default='output',
+                        help='Output directory (default: output)')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    output = os.path.abspath(args.output)
+    points = sweep_points(args)
+
+    os.makedirs(output, exist_ok=True)
+    write_index(output, points)
+
+    # The workers import simulation.py and statistics.py
+    # from this directory, whatever the working directory
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(run_point, point, output) for point in points]
+
+        for done, future in enumerate(as_completed(futures), 1):
+            name, timings = future.result()
+            print('[{0}/{1}] {2}: simulation {3:.3f} s, statistics {4:.3f} s'.format(
+                done, len(points), name, timings['simulation'], timings['statistics']))
+            sys.stdout.flush()
+
+    print('{0} points in {1:.2f} s'.format(len(points), time.time() - start))
+
+if __name__ == '__main__':
+    main()
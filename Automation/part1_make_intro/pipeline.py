@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# A stage of the pipeline: the program it runs and its command
+# line arguments, the other code it imports, the data files it
+# reads and the files it writes
+Stage = namedtuple('Stage', ['name', 'program', 'args', 'code', 'inputs', 'outputs'])
+
+# The two figures are separate stages, so that they are made
+# at the same time once the statistics are done
+STAGES = [Stage('simulation', 'simulation.py', [], ['propagation.py', 'observables.py', 'artifact.py'],
+                [], ['psi_t.npa']),
+          Stage('statistics', 'statistics.py', [], ['observables.py', 'artifact.py'],
+                ['psi_t.npa'], ['exp_sigma.npa']),
+          Stage('exp_sigma', 'graphics.py', ['exp_sigma'], ['artifact.py', 'searchpath.py'],
+                ['psi_t.npa', 'exp_sigma.npa'], ['exp_sigma.pdf']),
+          Stage('bloch', 'graphics.py', ['bloch'], ['artifact.py', 'searchpath.py'],
+                ['psi_t.npa', 'exp_sigma.npa'], ['bloch.pdf'])]
+
+# The fingerprints of the stages last run are kept in this file
+STATE_FILE = '.pipeline.json'
+
+def file_hash(path):
+    r'''
+    Returns the sha256 hash of the contents of a file, as a hexadecimal string
+    '''
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+def fingerprint(stage):
+    r'''
+    Hashes everything that determines the outputs of a stage
+
+    These are the contents of its program, its command line arguments,
+    the contents of the code it imports and of its input files, and the version of the Python interpreter. Contents
+    are hashed rather than compared by time stamp, so a stage which is
+    rerun and writes identical outputs doesn't make the later stages run.
+
+    Inputs
+    ------
+    stage: A Stage
+
+    Returns
+    -------
+    key: A hexadecimal string
+    '''
+
+    record = {'python': sys.version,
+              'args': stage.args,
+              'files': dict((path, file_hash(path))
+                            for path in [stage.program] + stage.code + stage.inputs)}
+
+    text = json.dumps(record, sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def read_state():
+    r'''
+    Returns the fingerprints recorded by earlier runs, as a dictionary
+    mapping the names of the stages to their fingerprints
+    '''
+
+    if not os.path.exists(STATE_FILE):
+        return {}
+
+    with open(STATE_FILE, 'r') as f:
+        return json.load(f)
+
+def write_state(state):
+    with open(STATE_FILE + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(STATE_FILE + '.tmp', STATE_FILE)
+
+def needed_stages(targets):
+    r'''
+    Lists the stages needed to make the given stages, in the order of STAGES
+
+    Inputs
+    ------
+    targets: A list of names of stages
+
+    Returns
+    -------
+    stages: A list of Stage
+    '''
+
+    producers = dict((output, stage) for stage in STAGES for output in stage.outputs)
+    by_name = dict((stage.name, stage) for stage in STAGES)
+
+    needed = set()
+    pending = [by_name[name] for name in targets]
+    while pending:
+        stage = pending.pop()
+        if stage.name in needed:
+            continue
+        needed.add(stage.name)
+        pending.extend(producers[path] for path in stage.inputs)
+
+    return [stage for stage in STAGES if stage.name in needed]
+
+def run_stage(stage):
+    r'''
+    Runs the program of a stage, with its arguments, with the current Python interpreter
+
+    Returns
+    -------
+    elapsed: The time taken, in seconds
+    '''
+
+    start = time.time()
+    subprocess.check_call([sys.executable, stage.program] + stage.args)
+
+    return time.time() - start
+
+def run_pipeline(targets, jobs=None, force=False):
+    r'''
+    Runs the stages needed to make targets, skipping those which are up to date
+
+    A stage runs once all the stages producing its inputs are done. Stages
+    whose inputs are ready are run concurrently, in up to jobs processes.
+    When a stage is ready, its fingerprint is compared with the one
+    recorded the last time it ran, and it is skipped if they are the same
+    and its outputs exist.
+
+    Inputs
+    ------
+    targets: A list of names of stages
+
+    jobs: The largest number of stages run at once. Optional
+
+    force: If True, run every stage, even if it is up to date. Optional
+
+    Returns
+    -------
+    None. Runs the stages and updates STATE_FILE.
+    '''
+
+    stages = needed_stages(targets)
+    producers = dict((output, stage.name) for stage in stages for output in stage.outputs)
+    dependencies = dict((stage.name, set(producers[path] for path in stage.inputs))
+                        for stage in stages)
+
+    state = read_state()
+    keys = {}
+    done = set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        while len(done) < len(stages):
+            for stage in stages:
+                if stage.name in done or stage.name in running.values():
+                    continue
+                if not dependencies[stage.name] <= done:
+                    continue
+
+                keys[stage.name] = fingerprint(stage)
+                outputs_exist = all(os.path.exists(path) for path in stage.outputs)
+                if not force and outputs_exist and state.get(stage.name) == keys[stage.name]:
+                    print('{0}: up to date'.format(stage.name))
+                    done.add(stage.name)
+                    continue
+
+                print('{0}: running {1}'.format(stage.name, ' '.join([stage.program] + stage.args)))
+                sys.stdout.flush()
+                running[executor.submit(run_stage, stage)] = stage.name
+
+            if not running:
+                continue
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                elapsed = future.result()
+                print('{0}: done in {1:.2f} s'.format(name, elapsed))
+
+                # The stage is only recorded once it has succeeded,
+                # with the fingerprint of the inputs it ran with
+                state[name] = keys[name]
+                write_state(state)
+                done.add(name)
+
+def parse_args():
+    r'''
+    Parses the command line arguments of the pipeline runner
+
+    Returns
+    -------
+    args: An argparse.Namespace holding the options
+    '''
+
+    names = [stage.name for stage in STAGES]
+
+    parser = argparse.ArgumentParser(description='Runs the stages of the spin precession '
+                                                 'pipeline which are out of date')
+    parser.add_argument('targets', nargs='*', default=names,
+                        help='Stages to make, with the stages they depend on '
+                             '(default: all of them)')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='Largest number of stages run at once (default: the number of CPUs)')
+    parser.add_argument('--force', action='store_true',
+                        help='Run every stage, even those which are up to date')
+
+    args = parser.parse_args()
+    for target in args.targets:
+        if target not in names:
+            parser.error('unknown stage {0} (choose from {1})'.format(target, ', '.join(names)))
+
+    return args
+
+def main():
+    args = parse_args()
+
+    # The programs and their data are next to this file
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        run_pipeline(args.targets, jobs=args.jobs, force=args.force)
+    except subprocess.CalledProcessError as error:
+        sys.exit('{0} failed with exit status {1}'.format(' '.join(error.cmd[1:]), error.returncode))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import os
+import json
+import struct
+import numpy as np
+
+# The first bytes of every artifact file
+MAGIC = b'NPARTIFACT\x01\x00'
+
+# The header and every array start at a multiple of this many bytes
+ALIGNMENT = 64
+
+def aligned(n):
+    r'''
+    Rounds n up to the next multiple of ALIGNMENT
+    '''
+
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+def write_artifact(path, arrays, attrs=None):
+    r'''
+    Writes several numpy arrays to one self-describing file
+
+    The file starts with MAGIC, followed by the length of a json header
+    (as a little-endian 64-bit integer) and the header itself. The header
+    records the name, dtype, shape and byte offset of every array, and
+    the attributes attrs. The arrays follow as raw bytes, each starting at
+    a multiple of ALIGNMENT, so that each of them can be memory-mapped.
+    Unlike a pickle, reading the file only needs numpy, and no library
+    objects are stored.
+
+    The file is written under a temporary name and then renamed, so it
+    is either complete or absent.
+
+    Inputs
+    ------
+    path: The path of the file to write, e.g. "psi_t.npa"
+
+    arrays: A dictionary mapping names to numpy arrays (or anything array-like)
+
+    attrs: A dictionary of json-serializable values describing the run. Optional
+
+    Returns
+    -------
+    None. Writes the file path.
+    '''
+
+    arrays = dict((name, np.ascontiguousarray(array)) for name, array in arrays.items())
+
+    # Lay the arrays out one after the other, relative to the end of the header
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        entries[name] = {'dtype': array.dtype.str,
+                         'shape': list(array.shape),
+                         'offset': offset}
+        offset = aligned(offset + array.nbytes)
+
+    header = {'attrs': attrs or {}, 'arrays': entries}
+    text = json.dumps(header).encode('utf-8')
+
+    # The header is padded with spaces, so that the data starts aligned
+    start = aligned(len(MAGIC) + 8 + len(text))
+    text += b' ' * (start - len(MAGIC) - 8 - len(text))
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(text)))
+        f.write(text)
+
+        for name, array in arrays.items():
+            f.seek(start + entries[name]['offset'])
+            f.write(array.tobytes())
+
+        # Pad the file to its full length, in case the last array is empty
+        f.truncate(start + offset)
+
+    os.replace(path + '.tmp', path)
+
+def read_header(path):
+    r'''
+    Reads the header of a file written by write_artifact
+
+    Inputs
+    ------
+    path: The path of the file
+
+    Returns
+    -------
+    (start, header): start is the byte offset at which the data starts.
+                     header is a dictionary with the keys 'attrs' and 'arrays'.
+    '''
+
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{0} is not an artifact file'.format(path))
+
+        length, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(length).decode('utf-8'))
+
+    return len(MAGIC) + 8 + length, header
+
+def read_artifact(path, names=None, mmap=True):
+    r'''
+    Reads arrays from a file written by write_artifact
+
+    Inputs
+    ------
+    path: The path of the file
+
+    names: A list of the names of the arrays to read. Defaults to all of them. Optional
+
+    mmap: If True, the arrays are memory-mapped, so only the slices which
+          are actually used are read from disk. Optional
+
+    Returns
+    -------
+    (attrs, arrays): attrs is the dictionary of attributes passed to write_artifact.
+                     arrays is a dictionary mapping the names to numpy arrays.
+    '''
+
+    start, header = read_header(path)
+    entries = header['arrays']
+
+    if names is None:
+        names = list(entries)
+
+    arrays = {}
+    for name in names:
+        entry = entries[name]
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        offset = start + entry['offset']
+
+        if mmap and dtype.itemsize * int(np.prod(shape)) > 0:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        else:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+    return header['attrs'], arrays
@@ -1,77 +1,79 @@
-import qutip
 import numpy as np
-import pickle as pkl
-import os
-import matplotlib.pyplot as plt
-import seaborn
-
-# Open the files containing the expectation values
-inputfile_sigma = open('exp_sigma.pkl', 'rb')
-
-# Read the state vector at different times
-(exp_sigmax, exp_sigmay, exp_sigmaz) = pkl.load(inputfile_sigma)
-
-# Close the input file
-inputfile_sigma.close()
-
-# Open the file containing the results of the simulation
-inputfile = open('psi_t.pkl', 'rb')
-
-# Read the state vector at different tims
-psi_t = pkl.load(inputfile)
+import sys
+import matplotlib
+from artifact import read_artifact
+from searchpath import search_here_last
 
-# Close the input file
-inputfile.close()
-
-# Next we read the time steps
+# Draw to files only, without an interactive window
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
 
-# Open the file containing the time steps
-inputfile_tsteps = open('tsteps.pkl', 'rb')
+# The figures to make are given on the command line, e.g.
+# `python graphics.py exp_sigma'. By default both are made.
+figures = sys.argv[1:] or ['exp_sigma', 'bloch']
 
-# Read the time steps
-tsteps = pkl.load(inputfile_tsteps)
+# Read the expectation values
+attrs, arrays = read_artifact('exp_sigma.npa')
+exp_sigmax = arrays['exp_sigmax']
+exp_sigmay = arrays['exp_sigmay']
+exp_sigmaz = arrays['exp_sigmaz']
 
-# Close the file containing the time steps
-inputfile_tsteps.close()
+# Read the time steps and the state vector at different
+# times from the results of the simulation. The file is
+# memory-mapped, so only the parts we use are read.
+attrs, arrays = read_artifact('psi_t.npa', names=['tsteps', 'psi_t'])
+tsteps = arrays['tsteps']
+psi_t = arrays['psi_t']
 
 # Now to the actual graphics.
 
 # First we plot the expectation values of
 # sigmax, sigmay and sigmaz
-fig = plt.figure()
-ax = fig.add_axes([0, 0, 1, 1])
-ax.plot(tsteps, exp_sigmax, color='b', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_x\\rangle$')
-ax.plot(tsteps, exp_sigmay, color='r', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_y\\rangle$')
-ax.plot(tsteps, exp_sigmaz, color='g', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_z\\rangle$')
 
-# Make some space
-ax.set_ylim([-1, 1])
+if 'exp_sigma' in figures:
+    fig = plt.figure()
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.plot(tsteps, exp_sigmax, color='b', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_x\\rangle$')
+    ax.plot(tsteps, exp_sigmay, color='r', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_y\\rangle$')
+    ax.plot(tsteps, exp_sigmaz, color='g', ls='--', marker='o', clip_on=False, label='$\\langle\\sigma_z\\rangle$')
+
+    # Make some space
+    ax.set_ylim([-1, 1])
 
-# Show the legend, add axis titles
-ax.set_xlabel('Time, $t / \\frac{1}{\\omega}$')
-ax.set_ylabel('Expecation value of $\\sigma$, $\\langle\\sigma\\rangle / \\frac{\hbar}{2}$')
-ax.legend(loc='best', frameon=True, fancybox=True)
+    # Show the legend, add axis titles
+    ax.set_xlabel('Time, $t / \\frac{1}{\\omega}$')
+    ax.set_ylabel('Expecation value of $\\sigma$, $\\langle\\sigma\\rangle / \\frac{\hbar}{2}$')
+    ax.legend(loc='best', frameon=True, fancybox=True)
 
-# Save the plot
-fig.savefig('exp_sigma.pdf', filetype='pdf', bbox_inches='tight')
-plt.close()
+    # Save the plot
+    fig.savefig('exp_sigma.pdf', bbox_inches='tight')
+    plt.close()
 
 # Next we plot four steps in the rotation of the Bloch vector
 # using the functionality provided by the qutip library
 
-n_tsteps_one_oscillation = 32
-sphere = qutip.Bloch()
-sphere.sphere_alpha = 0.0
-sphere.vector_color = seaborn.color_palette('husl', n_colors=n_tsteps_one_oscillation)
+if 'bloch' in figures:
+    # Keep statistics.py from hiding the standard library's module
+    search_here_last()
+
+    # qutip and seaborn take long to import, and are
+    # only needed for this figure
+    import qutip
+    import seaborn
+
+    n_tsteps_one_oscillation = 32
+    sphere = qutip.Bloch()
+    sphere.sphere_alpha = 0.0
+    sphere.vector_color = seaborn.color_palette('husl', n_colors=n_tsteps_one_oscillation)
 
-# Mark the initial Bloch vector for reference
-a_0 = [exp_sigmax[0], exp_sigmay[0], exp_sigmaz[0]]
-sphere.add_points(a_0)
+    # Mark the initial Bloch vector for reference
+    a_0 = [exp_sigmax[0], exp_sigmay[0], exp_sigmaz[0]]
+    sphere.add_points(a_0)
 
-# Mark the next Bloch vector for reference of direction of motion
-a_1 = [exp_sigmax[1], exp_sigmay[1], exp_sigmaz[1]]
-sphere.add_points(a_1)
+    # Mark the next Bloch vector for reference of direction of motion
+    a_1 = [exp_sigmax[1], exp_sigmay[1], exp_sigmaz[1]]
+    sphere.add_points(a_1)
 
-sphere.add_states(psi_t.states[:n_tsteps_one_oscillation])
-sphere.make_sphere()
-plt.savefig('bloch.pdf', filetype='pdf', bbox_inches='tight')
+    sphere.add_states([qutip.Qobj(psi[:, np.newaxis]) for psi in psi_t[:n_tsteps_one_oscillation]])
+    sphere.make_sphere()
+    plt.savefig('bloch.pdf', bbox_inches='tight')
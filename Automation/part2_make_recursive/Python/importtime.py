@@ -0,0 +1,173 @@
+import os
+import sys
+import ast
+import json
+import argparse
+import subprocess
+from pipeline import STAGES
+
+def program_imports(program):
+    r'''
+    Lists the modules a program imports
+
+    Inputs
+    ------
+    program: The path of a Python program
+
+    Returns
+    -------
+    imports: A list of (module, lazy) tuples, in the order of the program.
+             lazy is True for imports which are not at the top level of the
+             program (e.g. inside a function or an if statement), and so
+             only cost time when that code runs.
+    '''
+
+    with open(program, 'r') as f:
+        tree = ast.parse(f.read(), filename=program)
+
+    top_level = set(id(node) for node in tree.body)
+
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules = [node.module]
+        else:
+            continue
+
+        for module in modules:
+            imports.append((module, id(node) not in top_level, node.lineno))
+
+    imports.sort(key=lambda element: element[2])
+    return [(module, lazy) for module, lazy, lineno in imports]
+
+def import_times(modules, directory):
+    r'''
+    Measures how long importing some modules takes, in a fresh interpreter
+
+    The modules are imported in order by python -X importtime, so a
+    module's time excludes whatever the earlier ones already imported.
+
+    Inputs
+    ------
+    modules: A list of module names
+
+    directory: The directory holding the program, where local modules are found
+
+    Returns
+    -------
+    times: A dictionary mapping the modules to their import time, in seconds
+    '''
+
+    # The local modules are searched last (see searchpath.py)
+    code = 'import sys; sys.path[0] = {0!r}; '.format(directory)
+    code += 'from searchpath import search_here_last; search_here_last(); '
+    code += '; '.join('import {0}'.format(module) for module in modules)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    # Lines look like "import time:  self | cumulative | name", where
+    # the name is indented by two spaces for every level of nesting
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if not line.startswith('import time:') or len(fields) != 3:
+            continue
+        name = fields[2]
+        if name.startswith('  ') or not fields[1].strip().isdigit():
+            continue
+        cumulative[name.strip()] = int(fields[1]) * 1e-6
+
+    return dict((module, cumulative.get(module, 0.)) for module in modules)
+
+def benchmark(program, repeat=5):
+    r'''
+    Measures the import time of a program, module by module
+
+    The top-level imports are timed first, then the lazy ones. Each
+    measurement is repeated, and the fastest is kept.
+
+    Inputs
+    ------
+    program: The path of a Python program
+
+    repeat: The number of measurements. Optional
+
+    Returns
+    -------
+    report: A dictionary with the keys 'startup' (the time taken by the
+            top-level imports), 'lazy' (the extra time taken by the others),
+            both in seconds, and 'modules', a list with a dictionary for each module
+    '''
+
+    imports = program_imports(program)
+    imports = [element for element in imports if not element[1]] + \
+              [element for element in imports if element[1]]
+    modules = [module for module, lazy in imports]
+    directory = os.path.dirname(os.path.abspath(program))
+
+    best = None
+    for i in range(repeat):
+        times = import_times(modules, directory)
+        best = times if best is None else dict((module, min(best[module], times[module]))
+                                               for module in modules)
+
+    report = {'startup': sum(best[module] for module, lazy in imports if not lazy),
+              'lazy': sum(best[module] for module, lazy in imports if lazy),
+              'modules': [{'module': module, 'lazy': lazy, 'time': best[module]}
+                          for module, lazy in imports]}
+
+    return report
+
+def parse_args():
+    r'''
+    Parses the command line arguments of the benchmark
+
+    Returns
+    -------
+    args: An argparse.Namespace holding the options
+    '''
+
+    parser = argparse.ArgumentParser(description='Measures the import time of the '
+                                                 'programs of each stage of the pipeline')
+    parser.add_argument('programs', nargs='*',
+                        help='Programs to measure (default: the programs of all the stages)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of measurements, of which the fastest is kept (default: 5)')
+    parser.add_argument('--output', default=None,
+                        help='Also write the results to this json file (default: none)')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Several stages can run the same program (graphics.py makes
+    # each figure), whose imports are only measured once
+    programs = args.programs
+    if not programs:
+        programs = []
+        for stage in STAGES:
+            path = os.path.join(here, stage.program)
+            if path not in programs:
+                programs.append(path)
+
+    results = {'python': sys.version, 'repeat': args.repeat, 'programs': {}}
+    for program in programs:
+        report = benchmark(program, args.repeat)
+        results['programs'][os.path.relpath(program, here)] = report
+
+        print('{0}: startup {1:.1f} ms, lazy {2:.1f} ms'.format(
+            program, 1e3 * report['startup'], 1e3 * report['lazy']))
+        for entry in report['modules']:
+            print('    {0:<24s} {1:8.1f} ms{2}'.format(
+                entry['module'], 1e3 * entry['time'], ' (lazy)' if entry['lazy'] else ''))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == '__main__':
+    main()
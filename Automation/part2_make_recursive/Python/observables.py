@@ -0,0 +1,71 @@
+import numpy as np
+
+# The Pauli matrices, as numpy arrays
+sigmax = np.array([[0, 1], [1, 0]], dtype=complex)
+sigmay = np.array([[0, -1j], [1j, 0]], dtype=complex)
+sigmaz = np.array([[1, 0], [0, -1]], dtype=complex)
+
+def as_operators(operators):
+    r'''
+    Stacks a list of operators into one complex numpy array
+
+    Inputs
+    ------
+    operators: A list of operators, each a qutip Qobj or a numpy array of
+               shape (dim, dim)
+
+    Returns
+    -------
+    ops: A complex numpy array of shape (n_ops, dim, dim)
+    '''
+
+    return np.array([op.full() if hasattr(op, 'full') else op
+                     for op in operators], dtype=complex)
+
+def expectation_values(states, operators):
+    r'''
+    Computes the expectation values of Hermitian operators in pure states
+
+    All the expectation values <psi|O|psi> are computed in a single einsum,
+    over all the operators and all the states at once, instead of looping
+    over the states in Python as qutip.expect does for a list of states.
+
+    Inputs
+    ------
+    states: A numpy array of state vectors of shape (..., dim), for example
+            the (n_tsteps, dim) output of propagate, or the
+            (n_states, n_tsteps, dim) output for an ensemble
+
+    operators: A list of Hermitian operators, each a qutip Qobj or a numpy
+               array of shape (dim, dim)
+
+    Returns
+    -------
+    expectations: A real numpy array of shape (n_ops, ...), whose k^th entry
+                  holds the expectation values of operators[k] in every state
+    '''
+
+    states = np.asarray(states, dtype=complex)
+    ops = as_operators(operators)
+
+    expectations = np.einsum('...i,kij,...j->k...', states.conj(), ops, states)
+
+    # Hermitian operators have real expectation values
+    return expectations.real
+
+def bloch_vector(states):
+    r'''
+    Computes the Bloch vector (<sigmax>, <sigmay>, <sigmaz>) of qubit states
+
+    Inputs
+    ------
+    states: A numpy array of qubit state vectors of shape (..., 2)
+
+    Returns
+    -------
+    (exp_sigmax, exp_sigmay, exp_sigmaz): Three real numpy arrays of shape (...)
+    '''
+
+    exp_sigmax, exp_sigmay, exp_sigmaz = expectation_values(states, [sigmax, sigmay, sigmaz])
+
+    return exp_sigmax, exp_sigmay, exp_sigmaz
@@ -1,10 +1,11 @@
-import qutip
 import numpy as np
-import pickle as pkl
-import os
+import sys
+from propagation import propagate, qubit_states
+from artifact import write_artifact
+from observables import sigmaz
 
-# Hamiltonian
-H = -qutip.sigmaz()
+# Hamiltonian, as a numpy array (so qutip need not be imported)
+H = -sigmaz
 
 # Number of oscillations
 n_oscillations = 4
@@ -15,48 +16,51 @@ n_tsteps = 128
 # List of times for which the solver should store the state vector
 tsteps = np.linspace(0, n_oscillations*np.pi, n_tsteps)
 
-# Get a random pure qubit state, parameterized by
+# Number of random initial states in the ensemble. The later stages
+# only use the first, so by default it is the only one. A larger
+# ensemble is made with e.g. `python simulation.py 1000'.
+n_states = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+# Get random pure qubit states, parameterized by
 # the polar angle theta of the Bloch vector and the
-# azimuthal angle phi of the Bloch vector
+# azimuthal angle phi of the Bloch vector.
+# Each row of angles holds (theta, phi) for one state.
 np.random.seed(1)
-theta = np.random.uniform(low=0, high=np.pi)
-phi = np.random.uniform(low=0, high=2*np.pi)
-
-# The state is defined using the qutip library's
-# basis states for qubits
-psi_0 = np.cos(theta/2) * qutip.basis(2, 0) + np.exp(1j*phi)*np.sin(theta/2) * qutip.basis(2, 1)
-
-# Solve for the state vector at different times
-# using the qutip library.
-psi_t = qutip.mesolve(H, psi_0, tsteps, [], [])
+angles = np.random.uniform(low=[0, 0], high=[np.pi, 2*np.pi], size=(n_states, 2))
+theta = angles[:, 0]
+phi = angles[:, 1]
+
+# The states are cos(theta/2)|0> + exp(i phi) sin(theta/2)|1>,
+# one per row of the (n_states, 2) array psi_0_ensemble
+psi_0_ensemble = qubit_states(theta, phi)
+
+# Solve for the state vectors at different times.
+# The Hamiltonian does not depend on time, so the
+# state is exp(-iHt) psi_0, which propagate() computes
+# for all the times and all the initial states at once
+# by diagonalizing H. psi_t_ensemble has shape
+# (n_states, n_tsteps, 2).
+psi_t_ensemble = propagate(H, psi_0_ensemble, tsteps)
+
+# The first state of the ensemble is the one we look at
+# in detail. psi_t is an array whose rows are its state
+# vectors at the different times.
+psi_t = psi_t_ensemble[0]
 
 # Now, we will save the output to a file
 
-# First we will save parameters of the simulation
-
-# Open output file for saving the Hamiltonian
-outputfile = open('hamiltonian.pkl', 'wb')
-
-# Save to output file
-pkl.dump(H, file=outputfile)
-
-# Close output file
-outputfile.close()
-
-# Open output file for saving the time steps
-outputfile = open('tsteps.pkl', 'wb')
-
-# Save to output file
-pkl.dump(tsteps, file=outputfile)
-
-# Close output file
-outputfile.close()
-
-# Open output file for saving the state vector
-outputfile = open('psi_t.pkl', 'wb')
-
-# Save to output file
-pkl.dump(psi_t, file=outputfile)
-
-# Close output file
-outputfile.close()
+# The parameters of the simulation and the state vectors
+# are saved together in one array file, psi_t.npa, from
+# which each array can be read back on its own (see
+# artifact.py). The whole ensemble is only saved if
+# there is more than the one state.
+arrays = {'hamiltonian': H,
+          'tsteps': tsteps,
+          'psi_t': psi_t}
+if n_states > 1:
+    arrays['psi_t_ensemble'] = psi_t_ensemble
+
+write_artifact('psi_t.npa', arrays,
+               attrs={'n_oscillations': n_oscillations,
+                      'n_tsteps': n_tsteps,
+                      'n_states': n_states})
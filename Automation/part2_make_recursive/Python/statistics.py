@@ -1,32 +1,23 @@
-import qutip
-import numpy as np
-import pickle as pkl
-import os
+from observables import bloch_vector
+from artifact import read_artifact, write_artifact
 
-# Open the file containing the results of the simulation
-inputfile = open('psi_t.pkl', 'rb')
+# Read the state vector at different times from the
+# file containing the results of the simulation. Only
+# psi_t is read, not the rest of the file.
+attrs, arrays = read_artifact('psi_t.npa', names=['psi_t'])
+psi_t = arrays['psi_t']
 
-# Read the state vector at different tims
-psi_t = pkl.load(inputfile)
 
-# Close the input file
-inputfile.close()
+# The state vectors are the rows of psi_t.
+# We compute the expectation values of sigmax, sigmay
+# and sigmaz (the Bloch vector) for all the time steps
+# at once, in a single vectorized operation.
+exp_sigmax, exp_sigmay, exp_sigmaz = bloch_vector(psi_t)
 
+# Now, we will save the expectation values to a file
 
-# Using functionality of the qutip library, we compute expectation
-# values of sigmax, sigmay and sigmaz
-exp_sigmax = qutip.expect(qutip.sigmax(), psi_t.states)
-exp_sigmay = qutip.expect(qutip.sigmay(), psi_t.states)
-exp_sigmaz = qutip.expect(qutip.sigmaz(), psi_t.states)
-
-# Now, we will save the expectation values to files
-
-# Open output file for saving the expectation values
-outputfile_sigma = open('exp_sigma.pkl', 'wb')
-
-# Save to output file
-pkl.dump((exp_sigmax, exp_sigmay, exp_sigmaz), file=outputfile_sigma)
-
-# Close output file
-outputfile_sigma.close()
-
+# Save the expectation values together in one array file
+write_artifact('exp_sigma.npa',
+               {'exp_sigmax': exp_sigmax,
+                'exp_sigmay': exp_sigmay,
+                'exp_sigmaz': exp_sigmaz})
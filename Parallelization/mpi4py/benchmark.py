@@ -0,0 +1,307 @@
+import os
+import ast
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import subprocess
+import tracemalloc
+import numpy as np
+
+#The kernels drawing +1/-1 steps, as an array of shape
+#(T, numTrajectories), rather than the trajectories
+STEP_KERNELS = ['binomial_steps', 'steps']
+
+#The kernels whose walks --validate checks
+VALIDATED = ['simulator'] + STEP_KERNELS
+
+#The biases of the coin checked by --validate. p = 0 and p = 1
+#are the deterministic edge cases, p = 0.5 takes the fast path
+#of step_kernel.StepDrawer and p = 0.3 the general one.
+VALIDATION_PS = [0., 0.3, 0.5, 1.]
+
+#The notebook comparing the loop-based and the vectorized simulators
+NOTEBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                        'Random_Walk_Simulator-Vectorization.ipynb')
+
+def notebook_kernels(path=NOTEBOOK):
+    r'''Loads the random walk simulators defined in the vectorization notebook
+
+    The code cells which only define functions are run in order, in a
+    namespace of their own. multiple_trajectories is defined twice in
+    the notebook, first with loops and then on top of the vectorized
+    single trajectory, so both versions are kept.
+
+    Inputs
+    ------
+    path: The path of the notebook. Optional
+
+    Returns
+    -------
+    kernels: A dictionary mapping the names 'loop', 'vectorized_single'
+             and 'vectorized_multiple' to functions called as
+             f(p, T, numTrajectories)
+    '''
+
+    with open(path, 'r') as f:
+        cells = json.load(f)['cells']
+
+    namespace = {'np': np}
+    versions = []
+
+    for cell in cells:
+        if cell['cell_type'] != 'code':
+            continue
+
+        source = ''.join(cell['source'])
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            #Cells with iPython magic
+            continue
+        if not tree.body or not all(isinstance(node, ast.FunctionDef) for node in tree.body):
+            continue
+
+        exec(compile(tree, path, 'exec'), namespace)
+        if any(node.name == 'multiple_trajectories' for node in tree.body):
+            versions.append(namespace['multiple_trajectories'])
+
+    return {'loop': versions[0],
+            'vectorized_single': versions[1],
+            'vectorized_multiple': namespace['vectorized_multiple_trajectories']}
+
+def simulator_kernel(p, T, numTrajectories):
+    r'''Calls simulator.multiple_trajectories with a fixed seed'''
+
+    import simulator
+    return simulator.multiple_trajectories(p, 0, T=T, numTrajectories=numTrajectories)
+
+def binomial_steps_kernel(p, T, numTrajectories):
+    r'''Draws +1/-1 steps as the simulator used to, with np.random.binomial and convert_value'''
+
+    import simulator
+    rng = np.random.default_rng(0)
+    return simulator.convert_value(rng.binomial(1, p, size=(T, numTrajectories))).astype(np.int8)
+
+def steps_kernel(p, T, numTrajectories):
+    r'''Draws +1/-1 steps with step_kernel.StepDrawer'''
+
+    from step_kernel import StepDrawer
+    drawer = StepDrawer(np.random.default_rng(0), p)
+    return drawer.draw(T * numTrajectories).reshape(T, numTrajectories)
+
+def all_kernels():
+    r'''Returns a dictionary mapping the names of all the kernels to their functions'''
+
+    kernels = notebook_kernels()
+    kernels['simulator'] = simulator_kernel
+    kernels['binomial_steps'] = binomial_steps_kernel
+    kernels['steps'] = steps_kernel
+    return kernels
+
+def measure(kernel, p, T, numTrajectories, repeat=3):
+    r'''Measures the speed and the peak memory use of a kernel
+
+    An untimed first run takes care of imports and other one-off costs.
+    The time is then the fastest of repeat runs. The peak memory is
+    measured in one more run with tracemalloc, which traces the memory
+    numpy allocates, but slows the kernel down.
+
+    Inputs
+    ------
+    kernel: A function called as kernel(p, T, numTrajectories)
+
+    p: The bias of the coin determining the random walk
+
+    T: The total number of timesteps
+
+    numTrajectories: The total number of trajectories
+
+    repeat: The number of timed runs. Optional
+
+    Returns
+    -------
+    result: A dictionary with the keys 'seconds', 'steps_per_second' and 'peak_bytes'
+    '''
+
+    kernel(p, T, numTrajectories)
+
+    seconds = np.inf
+    for i in range(repeat):
+        start = time.perf_counter()
+        kernel(p, T, numTrajectories)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        kernel(p, T, numTrajectories)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': seconds,
+            'steps_per_second': T * numTrajectories / seconds,
+            'peak_bytes': peak}
+
+def validate(kernel, name, ps, T, numTrajectories):
+    r'''Checks the walks of a kernel against the exact mean and variance
+
+    The steps of the STEP_KERNELS are summed up into trajectories, which
+    are compared with the exact moments by exact.validate.
+
+    Inputs
+    ------
+    kernel: A function called as kernel(p, T, numTrajectories)
+
+    name: The name of the kernel, one of VALIDATED
+
+    ps: A list of the biases of the coin
+
+    T: The total number of timesteps
+
+    numTrajectories: The total number of trajectories
+
+    Returns
+    -------
+    passed: True if the validation passed. Prints a table to screen.
+    '''
+
+    import simulator
+
+    means = []
+    variances = []
+    for p in ps:
+        trajectories = kernel(p, T, numTrajectories)
+        if name in STEP_KERNELS:
+            trajectories = np.cumsum(trajectories, axis=0, dtype=np.int64).T
+        means.append(trajectories.mean(axis=0))
+        variances.append(trajectories.var(axis=0))
+
+    return simulator.validation_report(np.array(ps), np.full(len(ps), numTrajectories),
+                                       np.array(means), np.array(variances))
+
+def git_commit():
+    r'''Returns the hash of the checked out git commit, or None outside a git repository'''
+
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode('ascii').strip()
+
+def compare(results, baseline):
+    r'''Prints the speed of each result relative to the matching result of an earlier run
+
+    Inputs
+    ------
+    results: The list of results of this run
+
+    baseline: The dictionary written by an earlier run
+
+    Returns
+    -------
+    None. Prints one line per result found in both runs.
+    '''
+
+    def key(result):
+        return (result['kernel'], result['T'], result['numTrajectories'], result['p'])
+
+    old = dict((key(result), result) for result in baseline['results'])
+
+    print('Compared with {0}:'.format(baseline.get('commit')))
+    for result in results:
+        if key(result) not in old:
+            continue
+        speedup = result['steps_per_second'] / old[key(result)]['steps_per_second']
+        memory = result['peak_bytes'] / max(old[key(result)]['peak_bytes'], 1)
+        print('{0:>20s} T={1:<8d} N={2:<8d} p={3:<5g} speed x{4:.2f}, memory x{5:.2f}'.format(
+            result['kernel'], result['T'], result['numTrajectories'], result['p'], speedup, memory))
+
+def parse_args(names):
+    r'''Parses the command line arguments of the benchmark
+
+    Inputs
+    ------
+    names: The names of the kernels
+
+    Returns
+    -------
+    args: An argparse.Namespace holding the options
+    '''
+
+    parser = argparse.ArgumentParser(description='Benchmarks the random walk simulators')
+    parser.add_argument('--kernels', nargs='+', choices=names, default=names,
+                        help='Kernels to benchmark (default: all)')
+    parser.add_argument('-T', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Numbers of timesteps (default: 100 1000 10000)')
+    parser.add_argument('--num-trajectories', type=int, nargs='+', default=[100, 1000],
+                        help='Numbers of trajectories (default: 100 1000)')
+    parser.add_argument('-p', type=float, nargs='+', default=None,
+                        help='Biases of the coin (default: 0.5, or {0} with --validate)'.format(
+                            ' '.join('{0:g}'.format(p) for p in VALIDATION_PS)))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs, of which the fastest is kept (default: 3)')
+    parser.add_argument('--loop-limit', type=int, default=10**6,
+                        help='Largest number of steps (T times the number of trajectories) '
+                             'run with the loop kernel, which is slow (default: 1000000)')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='File to write the results to (default: benchmark.json)')
+    parser.add_argument('--compare', default=None,
+                        help='Results of an earlier run to compare with (default: none)')
+    parser.add_argument('--validate', action='store_true',
+                        help='Instead of timing the kernels, check the mean and variance of '
+                             'their walks against the exact values. Only the kernels {0} '
+                             'are checked'.format(', '.join(VALIDATED)))
+
+    return parser.parse_args()
+
+def main():
+    kernels = all_kernels()
+    args = parse_args(list(kernels))
+
+    if args.validate:
+        passed = True
+        for name, T, numTrajectories in itertools.product(args.kernels, args.T, args.num_trajectories):
+            if name not in VALIDATED:
+                continue
+            print('{0} T={1} N={2}'.format(name, T, numTrajectories))
+            passed = validate(kernels[name], name, args.p or VALIDATION_PS, T, numTrajectories) and passed
+        sys.exit(0 if passed else 1)
+
+    args.p = args.p or [0.5]
+
+    results = []
+    for name, T, numTrajectories, p in itertools.product(args.kernels, args.T,
+                                                         args.num_trajectories, args.p):
+        if name == 'loop' and T * numTrajectories > args.loop_limit:
+            continue
+
+        result = {'kernel': name, 'T': T, 'numTrajectories': numTrajectories, 'p': p}
+        result.update(measure(kernels[name], p, T, numTrajectories, args.repeat))
+        results.append(result)
+
+        print('{0:>20s} T={1:<8d} N={2:<8d} p={3:<5g} {4:12.4g} steps/s {5:10.1f} MB'.format(
+            name, T, numTrajectories, p, result['steps_per_second'], result['peak_bytes'] / 2.**20))
+        sys.stdout.flush()
+
+    report = {'commit': git_commit(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'machine': platform.platform(),
+              'repeat': args.repeat,
+              'results': results}
+
+    with open(args.output + '.tmp', 'w') as f:
+        json.dump(report, f, indent=1)
+    os.replace(args.output + '.tmp', args.output)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
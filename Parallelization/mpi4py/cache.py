@@ -0,0 +1,155 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+def cache_key(params):
+    r'''Hashes a dictionary of simulation parameters into a cache key
+
+    Inputs
+    ------
+    params: A dictionary of json-serializable values. Everything that
+            determines the result must be in it.
+
+    Returns
+    -------
+    key: A hexadecimal string
+    '''
+
+    text = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ResultCache(object):
+    r'''A directory of results, addressed by the hash of their parameters
+
+    Every entry is one .npy or .npz file named after its key. Reading
+    an entry marks it as recently used, and when the total size of the
+    entries goes over maxBytes the least recently used ones are deleted.
+    Entries are written to a temporary file and renamed into place, so
+    several processes can share one cache.
+
+    Inputs
+    ------
+    directory: The directory holding the cache. Created if needed.
+
+    maxBytes: The largest total size of the entries, in bytes. Optional
+    '''
+
+    def __init__(self, directory, maxBytes=2**30):
+        self.directory = directory
+        self.maxBytes = maxBytes
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        #The cache may have been filled with a larger maxBytes
+        self.evict()
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+            return True
+        except OSError:
+            return False
+
+    def copy_to(self, key, dest):
+        r'''Copies the .npy entry key to the file dest
+
+        The copy is written next to dest and then renamed, so dest
+        is either complete or absent.
+
+        Returns
+        -------
+        hit: True if the entry was found and copied
+        '''
+
+        path = self._path(key, '.npy')
+        if not self._touch(path):
+            return False
+
+        try:
+            shutil.copyfile(path, dest + '.tmp')
+        except OSError:
+            #The entry was evicted while being copied
+            return False
+        os.replace(dest + '.tmp', dest)
+
+        return True
+
+    def load(self, key):
+        r'''Reads an entry
+
+        Returns
+        -------
+        value: A numpy array for a .npy entry, a dictionary of numpy arrays for
+               a .npz entry, or None if there is no entry for key
+        '''
+
+        for ext in ['.npy', '.npz']:
+            path = self._path(key, ext)
+            if not self._touch(path):
+                continue
+
+            try:
+                if ext == '.npy':
+                    return np.load(path)
+                with np.load(path) as data:
+                    return dict((name, data[name]) for name in data.files)
+            except (OSError, ValueError):
+                return None
+
+        return None
+
+    def store_file(self, key, src):
+        r'''Copies the .npy file src into the cache as the entry key'''
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(src, tmp)
+        self._commit(tmp, self._path(key, '.npy'))
+
+    def store(self, key, value):
+        r'''Stores a numpy array (as .npy) or a dictionary of numpy arrays (as .npz)'''
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(value, dict):
+                np.savez(f, **value)
+                ext = '.npz'
+            else:
+                np.save(f, value)
+                ext = '.npy'
+
+        self._commit(tmp, self._path(key, ext))
+
+    def _commit(self, tmp, path):
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        r'''Deletes the least recently used entries until the cache fits in maxBytes'''
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if not (name.endswith('.npy') or name.endswith('.npz')):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(entry[1] for entry in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,106 @@
+import os
+import glob
+import json
+
+#The manifest of completed work units lives in this
+#subdirectory of the data directory, one file per rank
+MANIFEST_DIR = 'manifest'
+
+#File recording the parameters of the sweep being run. It is kept
+#with the manifests, where it isn't mistaken for a chunk of trajectories
+SWEEP_FILE = os.path.join(MANIFEST_DIR, 'sweep.json')
+
+class Manifest(object):
+    r'''Records the work units a rank has completed
+
+    Every completed unit is appended as one line of json to the rank's
+    manifest file, which is flushed to disk straight away. A unit is
+    only recorded once its output is complete, so after a crash the
+    manifests list exactly the units which don't need to be redone.
+
+    Inputs
+    ------
+    directory: The data directory
+
+    rank: The rank of the process
+    '''
+
+    def __init__(self, directory, rank):
+        manifest_dir = os.path.join(directory, MANIFEST_DIR)
+        if not os.path.isdir(manifest_dir):
+            os.makedirs(manifest_dir, exist_ok=True)
+
+        self.f = open(os.path.join(manifest_dir, 'rank-{0}.jsonl'.format(rank)), 'a')
+
+    def record(self, name):
+        r'''Records that the unit called name is complete'''
+
+        self.f.write(json.dumps({'unit': name}) + '\n')
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+def completed_units(directory):
+    r'''Reads the names of the completed work units from all the manifests
+
+    Inputs
+    ------
+    directory: The data directory
+
+    Returns
+    -------
+    names: A set of unit names
+    '''
+
+    names = set()
+
+    for path in glob.glob(os.path.join(directory, MANIFEST_DIR, '*.jsonl')):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    names.add(json.loads(line)['unit'])
+                except ValueError:
+                    #A line cut short by a crash
+                    continue
+
+    return names
+
+def clear_manifests(directory):
+    r'''Deletes the manifests of an earlier sweep'''
+
+    for path in glob.glob(os.path.join(directory, MANIFEST_DIR, '*.jsonl')):
+        os.remove(path)
+
+def write_sweep(directory, params):
+    r'''Records the parameters of the sweep, so that a resumed run can check them
+
+    Inputs
+    ------
+    directory: The data directory
+
+    params: A dictionary of json-serializable values
+
+    Returns
+    -------
+    None. Writes SWEEP_FILE to directory.
+    '''
+
+    path = os.path.join(directory, SWEEP_FILE)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path + '.tmp', 'w') as f:
+        json.dump(params, f, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def read_sweep(directory):
+    r'''Returns the parameters recorded by write_sweep, or None if there are none'''
+
+    path = os.path.join(directory, SWEEP_FILE)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,140 @@
+import numpy as np
+
+#Default number of points kept per series. A figure is at most a few
+#thousand pixels wide, so more points than this can't be told apart.
+DEFAULT_POINTS = 2000
+
+def minmax_indices(y, max_points=DEFAULT_POINTS):
+    r'''Picks the points of a series to keep, preserving its envelope
+
+    The series is split into max_points // 2 buckets of consecutive
+    points, and the smallest and the largest point of every bucket
+    are kept, as well as the first and the last point. Drawn as a
+    line, the result covers the same vertical range as the full series
+    at every horizontal position, so peaks are never lost.
+
+    Inputs
+    ------
+    y: A one-dimensional numpy array (or memmap)
+
+    max_points: The largest number of points to keep (about). Optional
+
+    Returns
+    ------
+    indices: A sorted numpy array of the indices of the points kept
+    '''
+
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max(1, (max_points - 2) // 2)
+    size = -(-n // buckets)
+
+    #Pad the series with its last value, so that it
+    #reshapes to one row per bucket
+    padded = np.empty(buckets * size, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    rows = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    lowest = offsets + np.argmin(rows, axis=1)
+    highest = offsets + np.argmax(rows, axis=1)
+
+    indices = np.concatenate([[0, n - 1], lowest, highest])
+    return np.unique(np.minimum(indices, n - 1))
+
+def lttb_indices(x, y, max_points=DEFAULT_POINTS):
+    r'''Picks the points of a series to keep, with Largest-Triangle-Three-Buckets
+
+    The first and last points are kept. The others are split into
+    max_points - 2 buckets, and from each bucket the point kept is the
+    one making the largest triangle with the point kept from the previous
+    bucket and the average of the next bucket. This keeps the visual
+    shape of the series with exactly max_points points, but unlike
+    minmax_indices it may drop isolated extremes.
+
+    Inputs
+    ------
+    x: A one-dimensional numpy array of the horizontal coordinates
+
+    y: A one-dimensional numpy array of the values, of the same length as x
+
+    max_points: The number of points to keep. Must be at least 3. Optional
+
+    Returns
+    ------
+    indices: A sorted numpy array of the indices of the points kept
+    '''
+
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    #Bucket edges for the points between the first and the last
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+
+        #The average of the next bucket (the last point, for the last bucket)
+        if bucket + 2 < len(edges):
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+
+        #Twice the area of the triangles, for every point of the bucket
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous]) -
+                       (x[previous] - x[start:stop]) * (next_y - y[previous]))
+
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+
+    return indices
+
+def decimate(y, max_points=DEFAULT_POINTS, x=None, method='minmax'):
+    r'''Reduces a series to about max_points points before plotting it
+
+    Inputs
+    ------
+    y: A one-dimensional numpy array (or memmap) of the values
+
+    max_points: The number of points to keep (about, for minmax). If None,
+                the series is returned unchanged. Optional
+
+    x: A numpy array of the horizontal coordinates. Defaults to the
+       indices of y, as used by ax.plot(y). Optional
+
+    method: 'minmax' (see minmax_indices) or 'lttb' (see lttb_indices). Optional
+
+    Returns
+    ------
+    (x, y): Two numpy arrays holding the points kept, to pass to ax.plot
+    '''
+
+    y = np.asarray(y)
+    if x is None:
+        x = np.arange(len(y))
+
+    if max_points is None or len(y) <= max_points:
+        return np.asarray(x), y
+
+    if method == 'minmax':
+        indices = minmax_indices(y, max_points)
+    elif method == 'lttb':
+        indices = lttb_indices(x, y, max_points)
+    else:
+        raise ValueError('Unknown decimation method {0}'.format(method))
+
+    return np.asarray(x)[indices], y[indices]
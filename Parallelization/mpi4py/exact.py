@@ -0,0 +1,176 @@
+import math
+import numpy as np
+
+def exact_moments(p, T=100):
+    r'''
+    Computes the exact mean and variance of the position of a biased random walk
+
+    After t steps of +1 (probability p) or -1 (probability 1 - p),
+    the mean position is t(2p - 1) and the variance is 4tp(1 - p).
+
+    Inputs
+    ------
+    p: The bias of the coin determining the random walk
+
+    T: The total number of timesteps. Must be an integer. Optional
+
+    Returns
+    ------
+    (mean, var): Two numpy arrays of length T. As for the trajectories from
+                 multiple_trajectories, index t holds the value after t + 1 steps.
+    '''
+
+    steps = np.arange(1, T + 1)
+
+    mean = steps * (2 * p - 1.)
+    var = steps * 4 * p * (1. - p)
+
+    return mean, var
+
+def log_binomial_pmf(n, p):
+    r'''
+    Computes the log of the binomial distribution of the number of +1 steps
+
+    The binomial coefficients are evaluated with log-gamma functions, so
+    this costs O(n) and does not overflow for any n.
+
+    Inputs
+    ------
+    n: The number of steps
+
+    p: The probability of a +1 step
+
+    Returns
+    ------
+    log_pmf: A numpy array of length n + 1 holding the log of the probability
+             of k +1 steps, for k = 0, ..., n (-inf where it is 0)
+    '''
+
+    k = np.arange(n + 1)
+
+    #log(k!) for k = 0, ..., n
+    log_factorials = np.frompyfunc(math.lgamma, 1, 1)(k + 1.).astype(np.float64)
+    log_coefficients = log_factorials[n] - log_factorials - log_factorials[::-1]
+
+    #With p = 0 or p = 1, 0 * log(0) counts as 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_p, log_q = np.log(p), np.log1p(-p)
+        log_terms = np.where(k > 0, k * log_p, 0.) + np.where(k < n, (n - k) * log_q, 0.)
+
+    return log_coefficients + log_terms
+
+def position_distribution(p, T=100, timesteps=None):
+    r'''
+    Computes the exact distribution of the position of a biased random walk
+
+    After n steps the number of +1 steps is binomial, so the position
+    2k - n has probability C(n, k) p^k (1 - p)^(n - k), see log_binomial_pmf.
+    Only the timesteps asked for are evaluated, each in O(T).
+
+    Inputs
+    ------
+    p: The bias of the coin determining the random walk
+
+    T: The total number of timesteps. Must be an integer. Optional
+
+    timesteps: A list of the timesteps (indexed as for exact_moments) whose
+               distribution is returned. Defaults to the last one, [T - 1]. Optional
+
+    Returns
+    ------
+    (positions, probabilities): positions is a numpy array holding -T, ..., T.
+                                probabilities is a numpy array of shape
+                                (len(timesteps), 2T + 1) whose rows are the
+                                probability of each position at those timesteps.
+    '''
+
+    if timesteps is None:
+        timesteps = [T - 1]
+
+    positions = np.arange(-T, T + 1)
+    probabilities = np.zeros((len(timesteps), 2 * T + 1))
+
+    for row, t in enumerate(timesteps):
+        #After n steps the position 2k - n sits at index T - n + 2k
+        n = t + 1
+        probabilities[row, T - n:T + n + 1:2] = np.exp(log_binomial_pmf(n, p))
+
+    return positions, probabilities
+
+def fourth_central_moment(p, T=100):
+    r'''
+    Computes the exact fourth central moment of the position of a biased random walk
+
+    Used to get the sampling error of the variance in validate.
+
+    Inputs
+    ------
+    p: The bias of the coin determining the random walk
+
+    T: The total number of timesteps. Must be an integer. Optional
+
+    Returns
+    ------
+    mu4: A numpy array of length T, indexed as for exact_moments
+    '''
+
+    steps = np.arange(1, T + 1)
+
+    mu = 2 * p - 1.
+    var = 4 * p * (1. - p)
+    step_mu4 = p * (1 - mu)**4 + (1 - p) * (1 + mu)**4
+
+    #For a sum of t independent steps
+    return steps * step_mu4 + 3 * steps * (steps - 1) * var**2
+
+def validate(ps, counts, mean, var, threshold=5.):
+    r'''
+    Checks Monte Carlo estimates of the mean and variance against the exact values
+
+    For every p and timestep, the estimates are converted to z-scores using
+    their exact sampling error. Where the exact variance is zero (p = 0 or
+    p = 1), the estimates must match exactly.
+
+    Inputs
+    ------
+    ps: A numpy array of the values of $p$, of length numPs
+
+    counts: A numpy array holding the number of trajectories behind each estimate
+
+    mean: A numpy array of shape (numPs, T) holding the estimated means
+
+    var: A numpy array of shape (numPs, T) holding the estimated variances
+         (normalized by the number of trajectories, as np.var)
+
+    threshold: The largest z-score accepted. Optional
+
+    Returns
+    ------
+    (passed, report): passed is True if every z-score is below threshold.
+                      report is a list with, for each p, a tuple
+                      (p, largest |z| of the mean, largest |z| of the variance).
+    '''
+
+    passed = True
+    report = []
+
+    for p, n, sample_mean, sample_var in zip(ps, counts, mean, var):
+        T = len(sample_mean)
+        exact_mean, exact_var = exact_moments(p, T)
+
+        if exact_var[-1] == 0:
+            exact = np.array_equal(sample_mean, exact_mean) and np.allclose(sample_var, 0)
+            z_mean = z_var = 0. if exact else np.inf
+        else:
+            z_mean = np.max(np.abs(sample_mean - exact_mean) / np.sqrt(exact_var / n))
+
+            #The expected value and the variance of the
+            #(biased) sample variance of n samples
+            expected_var = exact_var * (n - 1.) / n
+            var_of_var = (fourth_central_moment(p, T) - exact_var**2 * (n - 3.) / (n - 1.)) / n
+            z_var = np.max(np.abs(sample_var - expected_var) / np.sqrt(var_of_var))
+
+        passed = passed and z_mean < threshold and z_var < threshold
+        report.append((p, z_mean, z_var))
+
+    return passed, report
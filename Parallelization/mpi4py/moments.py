@@ -0,0 +1,113 @@
+import numpy as np
+
+#Largest size in bytes of the float64 copy of (part of) a block
+#made by RunningMoments.update. Blocks with more timesteps than
+#fit are handled a slice of timesteps at a time.
+MAX_BYTES = 2**27
+
+class RunningMoments(object):
+    r'''Running per-timestep mean and variance of a set of trajectories
+
+    Trajectories are added in blocks, and the mean and the sum of squared
+    deviations (M2) are updated with Welford's algorithm, in the form for
+    combining two partial results (Chan et al.). Memory use is therefore
+    independent of the number of trajectories seen, and the temporaries
+    of an update are capped at MAX_BYTES, whatever the number of timesteps.
+
+    Inputs
+    ------
+    T: The number of timesteps of the trajectories
+    '''
+
+    def __init__(self, T):
+        self.count = 0
+        self.mean = np.zeros(T)
+        self.m2 = np.zeros(T)
+
+    def update(self, block, max_bytes=MAX_BYTES):
+        r'''Adds a block of trajectories
+
+        The block is read a slice of timesteps at a time, so that the
+        float64 copy of a slice takes at most max_bytes (but at least
+        one timestep is read at a time).
+
+        Inputs
+        ------
+        block: A numpy array (or memmap) of shape (numTrajectories, T)
+
+        max_bytes: The largest size of the temporaries, in bytes. Optional
+
+        Returns
+        -------
+        None. Updates the running mean and M2.
+        '''
+
+        count, T = block.shape
+        if count == 0:
+            return
+        if T != self.mean.shape[0]:
+            raise ValueError('Cannot combine trajectories with {0} and {1} timesteps'.format(
+                self.mean.shape[0], T))
+
+        width = max(1, max_bytes // (8 * count))
+
+        for start in range(0, T, width):
+            #A copy, so the deviations can be computed in place
+            part = block[:, start:start + width].astype(np.float64)
+            part_mean = np.mean(part, axis=0)
+            part -= part_mean
+            np.square(part, out=part)
+
+            self._combine_range(start, count, part_mean, np.sum(part, axis=0))
+
+        self.count += count
+
+    def combine(self, other):
+        r'''Adds the trajectories summarized by another RunningMoments
+
+        Inputs
+        ------
+        other: A RunningMoments with the same number of timesteps
+
+        Returns
+        -------
+        None. Updates the running mean and M2.
+        '''
+
+        if other.count == 0:
+            return
+
+        self._combine(other.count, other.mean, other.m2)
+
+    def _combine(self, count, mean, m2):
+        if self.mean.shape != mean.shape:
+            raise ValueError('Cannot combine trajectories with {0} and {1} timesteps'.format(
+                self.mean.shape[0], mean.shape[0]))
+
+        self._combine_range(0, count, mean, m2)
+        self.count += count
+
+    def _combine_range(self, start, count, mean, m2):
+        #Combines the timesteps start, start + 1, ... of count
+        #trajectories with the same timesteps of self.count
+        #trajectories. Leaves self.count to the caller.
+        stop = start + mean.shape[0]
+        total = self.count + count
+        delta = mean - self.mean[start:stop]
+
+        self.mean[start:stop] += delta * (count / total)
+        self.m2[start:stop] += m2 + delta**2 * (self.count * count / total)
+
+    def variance(self, ddof=0):
+        r'''Returns the per-timestep variance
+
+        Inputs
+        ------
+        ddof: Delta degrees of freedom, as in np.var. Optional
+
+        Returns
+        -------
+        variance: A numpy array of length T
+        '''
+
+        return self.m2 / (self.count - ddof)
@@ -1,57 +1,332 @@
-import numpy as np
+import os
+import sys
 import json
-import glob
-import matplotlib.pyplot as plt
+import hashlib
+import numpy as np
+import trajectory_io
+from moments import RunningMoments
+from decimate import decimate, DEFAULT_POINTS
+from concurrent.futures import ProcessPoolExecutor
+
+#File name of the plot, and of the fingerprint of the
+#data it was made from, in the directory of the data
+PLOT = 'mean_trajectory.pdf'
+PLOT_FINGERPRINT = 'mean_trajectory.fingerprint'
+
+#The figure of this process, reused by every plot it makes
+_template = None
+
+def pyplot():
+    r'''Imports matplotlib.pyplot, with the non-interactive Agg backend
+
+    matplotlib and seaborn take long to import, and are only needed
+    to draw, so they are imported on the first call rather than when
+    this module is imported (e.g. by the simulator).
+
+    Returns
+    -------
+    plt: The matplotlib.pyplot module
+    '''
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    try:
+        import seaborn
+    except Exception:
+        print('Seaborn not installed on this machine.')
+
+    return plt
+
+def merge_moments(accumulators, other):
+    r'''Combines two dictionaries of RunningMoments, as made by aggregate_moments
+
+    Used to reduce the accumulators of all the ranks onto rank 0.
+    Either dictionary may hold values of p the other does not.
+
+    Returns
+    -------
+    accumulators: The combined dictionary (accumulators, updated in place)
+    '''
+
+    for p, moments in other.items():
+        if p in accumulators:
+            accumulators[p].combine(moments)
+        else:
+            accumulators[p] = moments
+
+    return accumulators
+
+def aggregate_moments(directory='simulated_data', block_size=1000, comm=None):
+    r'''Computes the per-timestep mean and variance of the trajectories for each p
+
+    The trajectory files are read in blocks of block_size trajectories
+    (binary chunks are memory-mapped), and each block is folded into a
+    RunningMoments accumulator for its value of p. Chunks simulated with
+    the same p, in different files, are combined into one accumulator.
+    Each block is itself read a slice of timesteps at a time (see
+    RunningMoments.update). Peak memory is therefore set by block_size
+    and moments.MAX_BYTES, not by the number of trajectories on disk
+    or their length.
+
+    With an MPI communicator, every rank reads its own share of the chunks
+    (see trajectory_io.iter_chunks), and the accumulators of the ranks are
+    combined onto rank 0 with merge_moments.
+
+    Inputs
+    ------
+    directory: The directory holding the simulated data. Optional
+
+    block_size: The number of trajectories read at a time. Optional
+
+    comm: An mpi4py communicator. Optional
+
+    Returns
+    -------
+    accumulators: A dictionary mapping each value of p to a RunningMoments.
+                  With comm, None on all the ranks but rank 0.
+    '''
+
+    rank, size = (comm.Get_rank(), comm.Get_size()) if comm is not None else (0, 1)
+    accumulators = {}
+
+    for meta, trajectories in trajectory_io.iter_chunks(directory, rank=rank, size=size):
+        p = meta['p']
+        if p not in accumulators:
+            accumulators[p] = RunningMoments(trajectories.shape[1])
+
+        for start in range(0, trajectories.shape[0], block_size):
+            accumulators[p].update(trajectories[start:start + block_size])
+
+    if comm is not None:
+        accumulators = comm.reduce(accumulators, op=merge_moments, root=0)
+
+    return accumulators
+
+def mean_template():
+    r'''Returns the figure the mean displacement is drawn on
+
+    The figure, its axes and their labels are made once per process,
+    and reused by every call to draw_means.
+
+    Returns
+    -------
+    (fig, ax): The matplotlib figure and its axes
+    '''
+
+    global _template
+
+    if _template is None:
+        plt = pyplot()
+        fig = plt.figure()
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_xlabel('Timestep', fontsize=20)
+        ax.set_ylabel('Mean Displacement', fontsize=20)
+        ax.set_title('Examining Behavior of a Random Walk', fontsize=25)
+        _template = (fig, ax)
+
+    return _template
+
+def draw_means(means, path, max_points=DEFAULT_POINTS):
+    r'''Plots the mean displacement for each p on the template, and writes it to path
+
+    Inputs
+    ------
+    means: A dictionary mapping each value of p to a numpy array of length T
 
-try:
-    import seaborn
-except Exception:
-    print('Seaborn not installed on this machine.')
+    path: The file to write the figure to
 
-def make_plot():
+    max_points: Every curve is reduced to about this many points, keeping the
+                smallest and largest values in each stretch of timesteps (see
+                decimate.decimate). None plots every point. Optional
+
+    Returns
+    -------
+    None. Writes path.
+    '''
+
+    fig, ax = mean_template()
+
+    #Remove what the last plot drew on the template
+    for line in list(ax.lines):
+        line.remove()
+    if ax.get_legend() is not None:
+        ax.get_legend().remove()
+    ax.set_prop_cycle(None)
+
+    #Plot in order of p
+    #(Makes the plot easier to comprehend)
+    for p in sorted(means):
+        ax.plot(*decimate(means[p], max_points), label=np.round(p, 2))
+
+    ax.relim()
+    ax.autoscale_view()
+    ax.legend(loc=0, frameon=True, fancybox=True)
+    fig.savefig(path, bbox_inches='tight')
+
+def make_plot(directory='simulated_data', block_size=1000, path=PLOT, max_points=DEFAULT_POINTS,
+              comm=None):
     r'''Makes a plot of mean displacement of the random walk as a function
     of time
 
+    If the simulator was run with --reduce, the directory holds the
+    mean displacement itself (see trajectory_io.write_summary), and it
+    is plotted directly. Otherwise it is computed from the trajectories.
+
     Inputs
     ------
-    None. Reads in json files from the simulated_data directory and processes them
+    directory: The directory holding the trajectory files (binary .npy chunks,
+               or json files) or the summary written in reduce mode. Optional
+
+    block_size: The number of trajectories read at a time. See aggregate_moments.
+                Optional
+
+    path: The file to write the figure to. Optional
+
+    max_points: The number of points plotted per curve. See draw_means. Optional
+
+    comm: An mpi4py communicator. If given, the ranks share out the reading of
+          the trajectories (see aggregate_moments), and rank 0 draws the figure.
+          This is collective over comm. Optional
 
     Outputs
     -------
     fig. A matplotlib figure showing the mean displacement for all the random walks
-         contained in the simulated_data directory. Writes the figure to disk.
+         contained in the simulated_data directory. Writes the figure to path.
     '''
 
-    #Grab all the data files
-    files = glob.glob('simulated_data/*.json')
-    data_holder = []
+    rank = comm.Get_rank() if comm is not None else 0
 
-    for fi in files:
-        with open(fi, 'r') as f:
-            data = json.load(f)
+    if trajectory_io.has_summary(directory):
+        if rank != 0:
+            return
+        summary = trajectory_io.read_summary(directory)
+        means = dict(zip(summary['p'], summary['mean']))
+    else:
+        #Stream through all the data files
+        accumulators = aggregate_moments(directory, block_size, comm)
+        if rank != 0:
+            return
+        means = dict((p, accumulators[p].mean) for p in accumulators)
 
-        data_holder.append([data['p'], np.int_(data['trajectories'])])
+    draw_means(means, path, max_points)
 
-    #Sort the list of (p, trajectory) values by p
-    #(Makes the plot easier to comprehend)
-    data_holder.sort()
+def data_fingerprint(directory):
+    r'''Returns a fingerprint of the data files in a directory
+
+    The name, size and modification time of every file are hashed,
+    which notices new or rewritten data without reading it (the
+    trajectories can be large).
+
+    Inputs
+    ------
+    directory: The directory holding the simulated data
+
+    Returns
+    -------
+    key: A hexadecimal string
+    '''
 
-    #Make a matplotlib figure
-    fig = plt.figure()
-    ax = fig.add_axes([0, 0, 1, 1])
+    files = []
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if not entry.is_file() or entry.name in (PLOT, PLOT_FINGERPRINT):
+            continue
+        stat = entry.stat()
+        files.append([entry.name, stat.st_size, stat.st_mtime_ns])
 
-    for element in data_holder:
-        ax.plot(np.mean(element[1], axis=0), label=np.round(element[0], 2))
+    text = json.dumps(files)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-    ax.legend(loc=0, frameon=True, fancybox=True)
-    ax.set_xlabel('Timestep', fontsize=20)
-    ax.set_ylabel('Mean Displacement', fontsize=20)
-    ax.set_title('Examining Behavior of a Random Walk', fontsize=25)
-    fig.savefig('mean_trajectory.pdf', bbox_inches='tight')
+def _render(directory, block_size, max_points):
+    #Runs in a worker process of make_plots
+    make_plot(directory, block_size, path=os.path.join(directory, PLOT), max_points=max_points)
+    return directory
+
+def make_plots(directories, block_size=1000, processes=None, force=False, max_points=DEFAULT_POINTS):
+    r'''Plots the mean displacement for several data directories, in a pool of processes
+
+    Every plot is written to PLOT in its data directory. A directory whose
+    data has not changed since its plot was made (see data_fingerprint)
+    is skipped. Each worker process draws all its plots on one template
+    figure (see mean_template).
+
+    Inputs
+    ------
+    directories: A list of directories holding simulated data
+
+    block_size: The number of trajectories read at a time. See aggregate_moments.
+                Optional
+
+    processes: The number of worker processes. Defaults to the number of CPUs. Optional
+
+    force: If True, make every plot, even if its data has not changed. Optional
+
+    max_points: The number of points plotted per curve. See draw_means. Optional
+
+    Returns
+    -------
+    made: The list of directories whose plot was made
+    '''
+
+    todo = {}
+    for directory in directories:
+        key = data_fingerprint(directory)
+        stamp = os.path.join(directory, PLOT_FINGERPRINT)
+
+        if not force and os.path.exists(os.path.join(directory, PLOT)) and os.path.exists(stamp):
+            with open(stamp, 'r') as f:
+                if f.read() == key:
+                    continue
+
+        todo[directory] = key
+
+    made = []
+    if not todo:
+        return made
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_render, directory, block_size, max_points) for directory in todo]
+        for future in futures:
+            directory = future.result()
+
+            #The fingerprint is only recorded once the plot is written
+            stamp = os.path.join(directory, PLOT_FINGERPRINT)
+            with open(trajectory_io.temporary_path(stamp), 'w') as f:
+                f.write(todo[directory])
+            trajectory_io.commit(stamp)
+            made.append(directory)
+
+    return made
+
+def world():
+    r'''Returns MPI.COMM_WORLD when run with several MPI processes, and None otherwise
+
+    mpi4py is only imported here, and is not needed to plot
+    with a single process.
+    '''
+
+    try:
+        from mpi4py import MPI
+    except ImportError:
+        return None
 
-    plt.close()
+    if MPI.COMM_WORLD.Get_size() == 1:
+        return None
+    return MPI.COMM_WORLD
 
 if __name__ == '__main__':
-    print('Making plot.')
-    make_plot()
-    print('Plot complete!')
\ No newline at end of file
+    #With no arguments, plot simulated_data as before,
+    #sharing out the data files if run with mpiexec.
+    #Otherwise plot every data directory given.
+    if len(sys.argv) > 1:
+        made = make_plots(sys.argv[1:])
+        print('Made {0} of {1} plots.'.format(len(made), len(sys.argv) - 1))
+    else:
+        comm = world()
+        rank = comm.Get_rank() if comm is not None else 0
+        if rank == 0:
+            print('Making plot.')
+        make_plot(comm=comm)
+        if rank == 0:
+            print('Plot complete!')
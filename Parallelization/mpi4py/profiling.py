@@ -0,0 +1,164 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+import numpy as np
+import trajectory_io
+
+#The phases a rank's time is split into, in the order they are reported
+#    draw: drawing the +1/-1 steps (see step_kernel.py)
+#    cumsum: summing the steps into positions
+#    assemble: copying blocks of positions into the (possibly memory-mapped) unit
+#    reduce: adding trajectories up in reduce mode (MomentSums)
+#    serialize: converting trajectories to text for the json format
+#    write: writing trajectories to the filesystem
+#    cache: reading and storing results in the cache
+#    checkpoint: recording completed units in the manifest
+#    wait: waiting for work, or for other ranks in collective writes
+#    schedule: handing out work, on the master of the dynamic schedule
+#    plot: plotting the results on rank 0 (--plot)
+PHASES = ['draw', 'cumsum', 'assemble', 'reduce', 'serialize',
+          'write', 'cache', 'checkpoint', 'wait', 'schedule', 'plot']
+
+class Profile(object):
+    r'''Per-phase timers and byte counters of one rank
+
+    The time spent in each phase (see PHASES) is added up over the
+    run, along with the number of bytes handled by some phases and
+    the number of steps simulated. The timers are cheap enough to be
+    left on: they are only started and stopped once per block.
+    '''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = dict((name, 0.) for name in PHASES)
+        self.bytes = {}
+        self.steps = 0
+
+    @contextmanager
+    def phase(self, name):
+        r'''Adds the time spent in a with block to the phase called name'''
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.) + time.perf_counter() - start
+
+    def add_bytes(self, name, n):
+        r'''Adds n bytes to the count of the phase called name'''
+
+        self.bytes[name] = self.bytes.get(name, 0) + int(n)
+
+    def add_steps(self, n):
+        r'''Adds n simulated steps (trajectories times timesteps)'''
+
+        self.steps += int(n)
+
+    def merge(self, other):
+        r'''Adds the times and counts of another Profile, e.g. one kept by a thread
+
+        Times merged from several threads are summed, so with
+        threads the phases can add up to more than the elapsed time.
+        '''
+
+        for name, seconds in other.seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.) + seconds
+        for name, n in other.bytes.items():
+            self.add_bytes(name, n)
+        self.add_steps(other.steps)
+
+    def as_dict(self):
+        r'''Returns the timers and counters so far, as a json-serializable dictionary
+
+        'elapsed' is the time since the Profile was made, and 'untimed'
+        the part of it not spent in any phase.
+        '''
+
+        elapsed = time.perf_counter() - self.start
+
+        return {'elapsed': elapsed,
+                'untimed': max(elapsed - sum(self.seconds.values()), 0.),
+                'seconds': dict(self.seconds),
+                'bytes': dict(self.bytes),
+                'steps': self.steps}
+
+def summarize(profiles):
+    r'''Combines the profiles of all the ranks into a report
+
+    Inputs
+    ------
+    profiles: A list, indexed by rank, of the dictionaries returned by Profile.as_dict
+
+    Returns
+    -------
+    report: A dictionary with
+            'elapsed': the run time of the slowest rank, in seconds
+            'phases': for every phase, the 'min', 'mean' and 'max' time over the
+                      ranks, and the rank taking the longest ('slowest')
+            'bytes': the total number of bytes of each phase over all the ranks
+            'steps': the total number of steps simulated
+            'steps_per_second': steps / elapsed
+            'MB_per_second': for every phase with a byte count, the total in MB / elapsed
+            'ranks': the profiles
+    '''
+
+    elapsed = max(profile['elapsed'] for profile in profiles)
+
+    names = [name for name in PHASES if any(name in profile['seconds'] for profile in profiles)]
+    names += sorted(set(name for profile in profiles for name in profile['seconds']) - set(names))
+
+    phases = {}
+    for name in names + ['untimed']:
+        if name == 'untimed':
+            seconds = np.array([profile['untimed'] for profile in profiles])
+        else:
+            seconds = np.array([profile['seconds'].get(name, 0.) for profile in profiles])
+        phases[name] = {'min': float(seconds.min()), 'mean': float(seconds.mean()),
+                        'max': float(seconds.max()), 'slowest': int(np.argmax(seconds))}
+
+    totals = {}
+    for profile in profiles:
+        for name, n in profile['bytes'].items():
+            totals[name] = totals.get(name, 0) + n
+
+    steps = sum(profile['steps'] for profile in profiles)
+
+    return {'elapsed': elapsed,
+            'phases': phases,
+            'bytes': totals,
+            'steps': steps,
+            'steps_per_second': steps / elapsed if elapsed > 0 else 0.,
+            'MB_per_second': dict((name, n / 2.**20 / elapsed if elapsed > 0 else 0.)
+                                  for name, n in totals.items()),
+            'ranks': profiles}
+
+def write_report(directory, report):
+    r'''Writes a report made by summarize to directory, as json
+
+    Returns
+    -------
+    path: The path of the report, trajectory_io.PROFILE in directory
+    '''
+
+    path = os.path.join(directory, trajectory_io.PROFILE)
+    with open(trajectory_io.temporary_path(path), 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    trajectory_io.commit(path)
+
+    return path
+
+def print_report(report):
+    r'''Prints the time of every phase over the ranks, and the throughput'''
+
+    print('{0:>12} {1:>10} {2:>10} {3:>10} {4:>8}'.format(
+        'phase', 'min (s)', 'mean (s)', 'max (s)', 'slowest'))
+    for name, phase in report['phases'].items():
+        if phase['max'] == 0:
+            continue
+        print('{0:>12} {1:>10.3f} {2:>10.3f} {3:>10.3f} {4:>8}'.format(
+            name, phase['min'], phase['mean'], phase['max'], phase['slowest']))
+
+    print('{0:.4g} steps/s over {1:.3f} s'.format(report['steps_per_second'], report['elapsed']))
+    for name, rate in sorted(report['MB_per_second'].items()):
+        print('{0}: {1:.1f} MB ({2:.1f} MB/s)'.format(name, report['bytes'][name] / 2.**20, rate))
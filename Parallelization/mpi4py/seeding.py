@@ -0,0 +1,73 @@
+import numpy as np
+
+def p_key(p):
+    r'''Maps a value of $p$ to an integer usable in a SeedSequence spawn key
+
+    The integer is the bit pattern of p as a 64-bit float, so every
+    distinct value of p gets a distinct key, whatever its position
+    in the sweep.
+
+    Inputs
+    ------
+    p: The value of $p$
+
+    Returns
+    -------
+    key: A non-negative Python integer
+    '''
+
+    return int(np.float64(p).view(np.uint64))
+
+def unit_seed_sequence(rootSeed, p, block):
+    r'''Returns the SeedSequence of the work unit (p, block)
+
+    The streams form a tree below the root seed: the sequence of p is
+    the child of the root with spawn key p_key(p), and the sequence of
+    a block is the block^th child of that, i.e. what
+    SeedSequence.spawn() would return, without having to spawn all
+    the earlier children (see sub_block_generator for the children
+    of a unit). The stream of a unit therefore only depends
+    on the root seed, p and the block number, and not on which rank
+    simulates it or in what order.
+
+    Inputs
+    ------
+    rootSeed: The root seed of the whole sweep. A non-negative integer
+
+    p: The value of $p$ of the unit
+
+    block: The block number of the unit
+
+    Returns
+    -------
+    seedSequence: A numpy.random.SeedSequence
+    '''
+
+    return np.random.SeedSequence(rootSeed, spawn_key=(p_key(p), block))
+
+def sub_block_generator(rootSeed, p, block, sub):
+    r'''Returns a fresh random number generator for a sub-block of the work unit (p, block)
+
+    The trajectories of a unit are drawn in sub-blocks, which may be
+    simulated by different threads (see simulator.simulate_unit). The
+    sequence of a sub-block is the sub^th child of the sequence of the
+    unit, so the trajectories only depend on how the unit is split into
+    sub-blocks, and not on how many threads simulate them.
+
+    Inputs
+    ------
+    rootSeed: The root seed of the whole sweep. A non-negative integer
+
+    p: The value of $p$ of the unit
+
+    block: The block number of the unit
+
+    sub: The number of the sub-block within the unit
+
+    Returns
+    -------
+    rng: A numpy.random.Generator
+    '''
+
+    unit = unit_seed_sequence(rootSeed, p, block)
+    return np.random.default_rng(np.random.SeedSequence(unit.entropy, spawn_key=unit.spawn_key + (sub,)))
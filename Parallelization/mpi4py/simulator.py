@@ -1,7 +1,20 @@
 from mpi4py import MPI
 import os
-import numpy as np
+import time
 import json
+import queue
+import argparse
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import trajectory_io
+import seeding
+import exact
+import cache
+import checkpoint
+import profiling
+from step_kernel import StepDrawer
 
 def convert_value(value):
     r'''
@@ -26,7 +39,93 @@ def convert_value(value):
 
     return converted_value
 
-def multiple_trajectories(p, Seed, T=100, numTrajectories=100):
+def position_dtype(T):
+    r'''
+    Returns the narrowest signed integer dtype which can hold the
+    position of a walk of T steps, i.e. any integer in [-T, T]
+
+    Inputs
+    ------
+    T: The total number of timesteps
+
+    Returns
+    ------
+    dtype: A numpy dtype (int8, int16, int32 or int64)
+    '''
+
+    for dtype in [np.int8, np.int16, np.int32]:
+        if T <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+
+    return np.dtype(np.int64)
+
+def trajectory_blocks(p, Seed, T=100, numTrajectories=100, timeBlock=1024, profile=None):
+    r'''
+    Simulates multiple trajectories of a random walk, a block of timesteps at a time
+
+    Only one block of timesteps is held in memory at a time, so T can be
+    far larger than would fit in a single (numTrajectories, T) array. The
+    position reached at the end of each block is carried over to the next.
+    The steps are drawn timestep by timestep (all trajectories for the first
+    timestep, then all for the second, ...) by a step_kernel.StepDrawer,
+    which carries its unused random bits over too, so the trajectories do
+    not depend on timeBlock.
+
+    Inputs
+    ------
+    p: The bias of the coin determining the random walk
+
+    Seed: The random number generator to draw from, a numpy.random.Generator
+          (see seeding.sub_block_generator). An integer is used as the seed of
+          a new Generator.
+
+    T: The total number of timesteps. Must be an integer. Optional
+
+    numTrajectories: The total number of trajectories to simulate. Must be an integer. Optional
+
+    timeBlock: The number of timesteps in a block. Must be an integer. Optional
+
+    profile: A profiling.Profile. The time spent drawing the steps and summing
+             them up ('draw' and 'cumsum') is added to it, as well as the number of steps. Optional
+
+    Returns
+    ------
+    A generator object which yields (t, positions), where positions is a numpy array
+    of shape (numTrajectories, timeBlock) holding the positions at timesteps
+    t, ..., t + timeBlock - 1 (the last block may be shorter). The dtype of
+    positions is position_dtype(T).
+    '''
+
+    if profile is None:
+        profile = profiling.Profile()
+
+    drawer = StepDrawer(np.random.default_rng(Seed), p)
+    dtype = position_dtype(T)
+
+    #The position of every trajectory at the end of the previous block
+    offset = np.zeros((numTrajectories, 1), dtype=dtype)
+
+    #The steps of a block, as +1/-1, one row per timestep
+    buffer = np.empty((min(timeBlock, T), numTrajectories), dtype=np.int8)
+
+    for t in range(0, T, timeBlock):
+        length = min(timeBlock, T - t)
+
+        #Draw the steps for this block, timestep by timestep
+        with profile.phase('draw'):
+            steps = drawer.draw(length * numTrajectories, out=buffer[:length]).T
+
+        #The displacements are a cumulative sum over
+        #the timesteps (axis=1), starting from the offset
+        with profile.phase('cumsum'):
+            positions = np.cumsum(steps, axis=1, dtype=dtype)
+            positions += offset
+            offset = positions[:, -1:].copy()
+        profile.add_steps(positions.size)
+
+        yield t, positions
+
+def multiple_trajectories(p, Seed, T=100, numTrajectories=100, profile=None):
     r'''
     Simulates multiple trajectories of a random walk
     
@@ -34,96 +133,998 @@ def multiple_trajectories(p, Seed, T=100, numTrajectories=100):
     ------
     p: The bias of the coin determining the random walk
     
-    Seed: A seed for numpy's random number generator.
+    Seed: The random number generator to draw from, a numpy.random.Generator
+          (see seeding.sub_block_generator). An integer is used as the seed of
+          a new Generator.
 
     T: The total number of timesteps. Must be an integer. Optional
     
     numTrajectories: The total number of trajectories to simulate. Must be an integer. Optional
+
+    profile: A profiling.Profile, see trajectory_blocks. Optional
     
     Returns
     ------
     trajectories: A numpy array of shape (numTrajectories,T) whose j^th row is the j^th simulated trajectory
-                       (which is itself of length T)
+                       (which is itself of length T). Its dtype is position_dtype(T).
     '''
 
-    #Set the random seed
-    np.random.seed(Seed)
-    
-    #Generate an array of binomially-distributed
-    #random variables whose shape is numTrajectories
-    #rows, and T columns
-    rvs = np.random.binomial(1, p, size=(numTrajectories, T))
-    
-    #Vectorize these values
-    steps = convert_value(rvs)
-    
-    #The displacements are again a cumulative sum
-    #but when calling np.cumsum(), we need to compute
-    #it over axis=1 (the columns)
-    trajectories = np.cumsum(steps, axis=1)
+    if profile is None:
+        profile = profiling.Profile()
+
+    trajectories = np.empty((numTrajectories, T), dtype=position_dtype(T))
+
+    #Fill in the trajectories block by block. This gives
+    #the same trajectories as trajectory_blocks, for any
+    #size of the blocks.
+    for t, positions in trajectory_blocks(p, Seed, T=T, numTrajectories=numTrajectories,
+                                          profile=profile):
+        with profile.phase('assemble'):
+            trajectories[:, t:t + positions.shape[1]] = positions
     
     return trajectories
 
-def write_trajectories(rank, index, p, trajectories):
+WorkUnit = namedtuple('WorkUnit', ['index', 'p', 'block', 'numTrajectories', 'seed', 'subBlock'])
+
+#Bump this whenever a change to the code changes the
+#trajectories simulated for a given seed, so that
+#results cached by older versions are not reused
+CACHE_VERSION = 3
+
+#Default number of trajectories in a sub-block, the part
+#of a work unit drawn from one random stream by one thread
+SUB_BLOCK = 128
+
+#Message tags used by the dynamic scheduler
+TAG_REQUEST = 1
+TAG_WORK = 2
+
+class SharedTrajectoryWriter(object):
+    r'''Writes the trajectories of all the ranks into one shared file with MPI-IO
+
+    Every work unit is written at the byte offset computed for it by
+    trajectory_io.shared_layout, so the ranks never write to the same
+    region. With collective=True the writes are collective (Write_at_all),
+    and every rank must call write() or skip() the same number of times.
+
+    Inputs
+    ------
+    comm: The MPI communicator. Opening the file is collective over comm.
+
+    directory: The directory to write the shared file to
+
+    offsets: A dictionary mapping unit names to byte offsets, see
+             trajectory_io.chunk_offsets
+
+    size: The size of the shared file in bytes
+
+    dtype: The numpy dtype the trajectories are stored as
+
+    collective: If True, use collective writes. Optional
+    '''
+
+    def __init__(self, comm, directory, offsets, size, dtype, collective=True):
+        self.offsets = offsets
+        self.dtype = np.dtype(dtype)
+        self.collective = collective
+
+        path = os.path.join(directory, trajectory_io.SHARED_DATA)
+        self.fh = MPI.File.Open(comm, path, MPI.MODE_WRONLY | MPI.MODE_CREATE)
+        self.fh.Set_size(size)
+
+    def write(self, name, trajectories):
+        r'''Writes the trajectories of the unit called name'''
+
+        buf = np.ascontiguousarray(trajectories, dtype=self.dtype)
+        if self.collective:
+            self.fh.Write_at_all(self.offsets[name], buf)
+        else:
+            self.fh.Write_at(self.offsets[name], buf)
+
+    def skip(self):
+        r'''Takes part in a collective write without writing anything'''
+
+        self.fh.Write_at_all(0, np.empty(0, dtype=self.dtype))
+
+    def close(self):
+        r'''Closes the shared file. This is collective.'''
+
+        self.fh.Close()
+
+class MomentSums(object):
+    r'''Per-timestep sums and sums of squares of trajectories, for each p
+
+    Used in reduce mode: rather than writing trajectories to disk,
+    each rank adds them up, and the sums are combined over the ranks
+    with reduce(). The sums are integers, so they are exact and do not
+    depend on how the trajectories were split over the ranks (as long
+    as T**2 * numTrajectories fits in an int64).
+
+    Inputs
+    ------
+    numPs: The number of values of $p$ in the sweep
+
+    T: The total number of timesteps
+    '''
+
+    def __init__(self, numPs, T):
+        self.counts = np.zeros(numPs, dtype=np.int64)
+        self.sums = np.zeros((numPs, T), dtype=np.int64)
+        self.sumsq = np.zeros((numPs, T), dtype=np.int64)
+
+    def add(self, index, trajectories, t=0):
+        r'''Adds trajectories simulated with the index^th value of p
+
+        Inputs
+        ------
+        index: The position of p in the sweep
+
+        trajectories: A numpy array of shape (numTrajectories, length), holding
+                      the positions at timesteps t, ..., t + length - 1
+
+        t: The first timestep in trajectories. The trajectories are only
+           counted once, when t is 0. Optional
+        '''
+
+        trajectories = np.asarray(trajectories, dtype=np.int64)
+        length = trajectories.shape[1]
+
+        if t == 0:
+            self.counts[index] += trajectories.shape[0]
+        self.sums[index, t:t + length] += np.sum(trajectories, axis=0)
+        self.sumsq[index, t:t + length] += np.sum(trajectories**2, axis=0)
+
+    def reduce(self, comm, root=0):
+        r'''Sums the MomentSums of all the ranks onto root
+
+        Inputs
+        ------
+        comm: The MPI communicator. This is collective over comm.
+
+        root: The rank receiving the result. Optional
+
+        Returns
+        -------
+        total: On root, a MomentSums holding the sums over all ranks.
+               None on the other ranks.
+        '''
+
+        numPs, T = self.sums.shape
+        total = MomentSums(numPs, T) if comm.Get_rank() == root else None
+
+        for name in ['counts', 'sums', 'sumsq']:
+            recvbuf = getattr(total, name) if total is not None else None
+            comm.Reduce(getattr(self, name), recvbuf, op=MPI.SUM, root=root)
+
+        return total
+
+    def merge(self, index, other):
+        r'''Adds the sums of a MomentSums with a single value of p
+        to those of the index^th value of p'''
+
+        self.counts[index] += other.counts[0]
+        self.sums[index] += other.sums[0]
+        self.sumsq[index] += other.sumsq[0]
+
+    def moments(self):
+        r'''Returns (mean, var), the per-timestep mean and variance for each p,
+        as numpy arrays of shape (numPs, T)'''
+
+        counts = self.counts[:, np.newaxis]
+        mean = self.sums / counts
+        var = self.sumsq / counts - mean**2
+
+        return mean, var
+
+class BackgroundWriter(object):
+    r'''Writes the output of work units in a thread of its own
+
+    While the thread writes the output of one unit, the rank goes on to
+    simulate the next. Jobs are run one at a time, in the order they were
+    submitted, so a unit is only recorded in the manifest once its output
+    is written, and collective writes stay in the same order on every rank.
+
+    At most depth jobs holding the output of a unit can be waiting or
+    running at once. Submitting another blocks until one of them is
+    written, which caps the memory held by unwritten output. With depth=1
+    this is double buffering: one unit is written while the next is
+    simulated.
+
+    Inputs
+    ------
+    depth: The largest number of units whose output is not written yet. Optional
+    '''
+
+    def __init__(self, depth=1):
+        self.jobs = queue.Queue()
+        self.slots = threading.Semaphore(depth)
+        self.error = None
+
+        #The thread's own timers, merged into the
+        #rank's profile by the caller at the end
+        self.profile = profiling.Profile()
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job, holdsBuffer = self.jobs.get()
+            if job is None:
+                break
+
+            #After an error, the remaining jobs are dropped
+            try:
+                if self.error is None:
+                    job(self.profile)
+            except BaseException as e:
+                self.error = e
+            finally:
+                if holdsBuffer:
+                    self.slots.release()
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+
+    def submit(self, job, profile, holdsBuffer=True):
+        r'''Queues job, to be called as job(profile) by the thread
+
+        Inputs
+        ------
+        job: A function of a profiling.Profile, which it adds the time it takes to
+
+        profile: The profiling.Profile of the calling thread. The time spent
+                 waiting for a free slot is added to it ('wait').
+
+        holdsBuffer: If True, job holds the output of a unit, and counts
+                     towards depth. Optional
+        '''
+
+        self._check()
+        if holdsBuffer:
+            with profile.phase('wait'):
+                self.slots.acquire()
+        self.jobs.put((job, holdsBuffer))
+
+    def close(self):
+        r'''Waits for every job to finish, and stops the thread
+
+        Raises the first exception raised by a job, if any.
+        '''
+
+        self.jobs.put((None, False))
+        self.thread.join()
+        self._check()
+
+def run_job(job, profile, background=None, holdsBuffer=True):
+    r'''Calls job(profile) now, or hands it to a BackgroundWriter
+
+    Inputs
+    ------
+    job: A function of a profiling.Profile, e.g. writing the output of a unit
+
+    profile: A profiling.Profile
+
+    background: A BackgroundWriter. If None, job is run straight away. Optional
+
+    holdsBuffer: See BackgroundWriter.submit. Optional
+
+    Returns
+    -------
+    None
+    '''
+
+    if background is None:
+        job(profile)
+    else:
+        background.submit(job, profile, holdsBuffer)
+
+def write_trajectories(name, p, trajectories, seed=None, block=None, fmt='npy', profile=None):
     r'''Writes trajectories to disk
 
     Inputs
     --------
 
-    rank: The rank of the process simulated the trajectory.
-          Used as a unique identifier.
-
-    index: An index to indicate which value of $p$ the process
-           used in its simulation
+    name: A unique name for the trajectories, e.g. "index-block".
+          Used as the file name.
 
     p: The value of $p$
 
     trajectories: A numpy array (or Python list) which holds the trajectories.
                   It's assumed trajectories has shape (numTrajectories, totalTime)
 
+    seed: The root seed used to simulate the trajectories. Recorded in the
+          metadata of the binary format. Optional
+
+    block: The block number of the trajectories, which together with
+           seed and p determines their random stream. Recorded in the
+           metadata of the binary format. Optional
+
+    fmt: The output format. Either 'npy' (a binary array plus a metadata
+         header, see trajectory_io.write_chunk) or 'json'. Optional
+
+    profile: A profiling.Profile. The time spent converting the trajectories
+             to text ('serialize') and writing them ('write') is added to it,
+             with the number of bytes written. Optional
+
     Returns
     -----
-    None. Writes the trajectory to a json file "rank-index.json" in the simulated_data
-          directory
+    None. Writes the trajectory to "name.npy" (and "name.meta.json")
+          or to "name.json" in the simulated_data directory
     '''
 
-    filename = '{0}-{1}.json'.format(rank, index)
+    if profile is None:
+        profile = profiling.Profile()
+
+    if fmt == 'npy':
+        with profile.phase('write'):
+            trajectory_io.write_chunk('simulated_data', name, p, seed, trajectories, block=block)
+        profile.add_bytes('write', np.asarray(trajectories).nbytes)
+    elif fmt == 'json':
+        with profile.phase('serialize'):
+            text = trajectory_io.encode_json_chunk(p, trajectories)
+        with profile.phase('write'):
+            trajectory_io.write_json_text('simulated_data', name, text)
+        profile.add_bytes('write', len(text))
+    else:
+        raise ValueError('Unknown output format {0}'.format(fmt))
+
+def work_units(ps, numTrajectories=100, blockSize=None, rootSeed=0, subBlock=SUB_BLOCK):
+    r'''Splits a parameter sweep into units of work
+
+    Each value of p is split into blocks of at most blockSize
+    trajectories. Every block is an independent unit of work,
+    which can be simulated by any rank.
+
+    Inputs
+    ------
+    ps: A numpy array or Python list of the values of $p$ to be iterated over
+
+    numTrajectories: The total number of trajectories to simulate for each p. Optional
+
+    blockSize: The maximum number of trajectories in a unit. Defaults to
+               numTrajectories (one unit per value of p). Optional
+
+    rootSeed: The root seed of the sweep. Optional
+
+    subBlock: The number of trajectories in a sub-block of a unit. Optional
+
+    Returns
+    -------
+    units: A list of WorkUnit(index, p, block, numTrajectories, seed, subBlock), where
+           index is the position of p in ps, block numbers the blocks of that p and seed
+           is the root seed. The trajectories of a unit are drawn in sub-blocks of subBlock
+           trajectories, with random streams derived from (seed, p, block, sub), see
+           simulate_unit.
+    '''
+
+    if blockSize is None:
+        blockSize = numTrajectories
+
+    units = []
+    for index, p in enumerate(ps):
+        for block, start in enumerate(range(0, numTrajectories, blockSize)):
+            rows = min(blockSize, numTrajectories - start)
+            units.append(WorkUnit(index, p, block, rows, rootSeed, subBlock))
+
+    return units
+
+def unit_name(unit):
+    r'''Returns the name of the file holding the trajectories of a work unit'''
+
+    return '{0}-{1}'.format(unit.index, unit.block)
+
+def unit_cache_key(unit, T, kind):
+    r'''Returns the cache key of the result of a work unit
+
+    Inputs
+    ------
+    unit: A WorkUnit
+
+    T: The total number of timesteps
+
+    kind: 'trajectories' or 'sums' (see MomentSums)
+
+    Returns
+    -------
+    key: A string, see cache.cache_key
+    '''
+
+    return cache.cache_key({'kind': kind,
+                            'p': float(unit.p),
+                            'T': int(T),
+                            'numTrajectories': int(unit.numTrajectories),
+                            'seed': int(unit.seed),
+                            'block': int(unit.block),
+                            'subBlock': int(unit.subBlock),
+                            'seeding': 'SeedSequence(seed, spawn_key=(p_key(p), block, sub))',
+                            'version': CACHE_VERSION,
+                            'numpy': np.__version__})
+
+def simulate_unit(unit, T, consume, timeBlock=1024, pool=None, profile=None):
+    r'''Simulates the trajectories of a work unit, one sub-block at a time or in threads
+
+    The trajectories of the unit are split into sub-blocks of unit.subBlock
+    trajectories, and the sub^th sub-block is drawn from its own random
+    stream (see seeding.sub_block_generator), a block of timesteps at a time
+    (see trajectory_blocks). The sub-blocks are simulated by the threads of
+    pool, which run in parallel as numpy releases the GIL while drawing and
+    summing the steps. As every sub-block has its own stream, the trajectories
+    do not depend on the number of threads.
+
+    Inputs
+    ------
+    unit: A WorkUnit
+
+    T: The total number of timesteps
+
+    consume: A function called as consume(start, t, positions, profile) for every
+             block, where positions holds trajectories start, start + 1, ... at
+             timesteps t, t + 1, ... With a pool, it is called from several threads
+             at once, for disjoint blocks of trajectories.
+
+    timeBlock: The number of timesteps generated at a time. Optional
+
+    pool: A concurrent.futures.ThreadPoolExecutor. If None, the sub-blocks are
+          simulated one after the other in this thread. Optional
+
+    profile: A profiling.Profile. The profiles kept by the threads are merged
+             into it, so its phase times are summed over the threads. Optional
+
+    Returns
+    -------
+    None
+    '''
+
+    def simulate_sub_block(sub):
+        start = sub * unit.subBlock
+        rows = min(unit.subBlock, unit.numTrajectories - start)
+        subProfile = profiling.Profile()
+
+        rng = seeding.sub_block_generator(unit.seed, unit.p, unit.block, sub)
+        for t, positions in trajectory_blocks(unit.p, rng, T, rows, timeBlock, profile=subProfile):
+            consume(start, t, positions, subProfile)
+
+        return subProfile
+
+    subs = range(-(-unit.numTrajectories // unit.subBlock))
+    if pool is None:
+        subProfiles = [simulate_sub_block(sub) for sub in subs]
+    else:
+        subProfiles = list(pool.map(simulate_sub_block, subs))
+
+    if profile is not None:
+        for subProfile in subProfiles:
+            profile.merge(subProfile)
+
+def unit_trajectories(unit, T, out, timeBlock=1024, pool=None, profile=None):
+    r'''Fills out with the trajectories of a work unit
+
+    Inputs
+    ------
+    unit: A WorkUnit
+
+    T: The total number of timesteps
+
+    out: A numpy array (or memmap) of shape (unit.numTrajectories, T). Every
+         sub-block is written into its own rows of it.
+
+    timeBlock, pool, profile: See simulate_unit. Optional
+
+    Returns
+    -------
+    out
+    '''
+
+    def consume(start, t, positions, subProfile):
+        with subProfile.phase('assemble'):
+            out[start:start + positions.shape[0], t:t + positions.shape[1]] = positions
+
+    simulate_unit(unit, T, consume, timeBlock, pool, profile)
+
+    return out
 
-    trajectories = [[str(x) for x in trajectory] for trajectory in trajectories]
+def unit_sums(unit, T, timeBlock=1024, pool=None, profile=None):
+    r'''Returns the MomentSums of the trajectories of a work unit
 
-    d = {'p': p, 'trajectories' : trajectories}
-    with open(os.path.join('simulated_data', filename), 'w') as f:
-        json.dump(d, f)
+    Every thread adds the blocks it simulates to a MomentSums of its own, and
+    these are added up at the end. The sums are integers, so the result does
+    not depend on the number of threads.
 
-def data_gen(ps):
+    Inputs
+    ------
+    unit: A WorkUnit
+
+    T: The total number of timesteps
+
+    timeBlock, pool, profile: See simulate_unit. Optional
+
+    Returns
+    -------
+    unitSums: A MomentSums with a single value of p
+    '''
+
+    local = threading.local()
+    partials = []
+
+    def consume(start, t, positions, subProfile):
+        if not hasattr(local, 'sums'):
+            local.sums = MomentSums(1, T)
+            partials.append(local.sums)
+        with subProfile.phase('reduce'):
+            local.sums.add(0, positions, t)
+
+    simulate_unit(unit, T, consume, timeBlock, pool, profile)
+
+    unitSums = MomentSums(1, T)
+    for partial in partials:
+        unitSums.merge(0, partial)
+
+    return unitSums
+
+def run_unit(unit, T=100, fmt='npy', writer=None, reducer=None, timeBlock=1024, resultCache=None,
+             pool=None, background=None, profile=None):
+    r'''Simulates the trajectories of one work unit and writes them to disk
+
+    The trajectories are generated a block of timesteps at a time (see
+    simulate_unit), and each block is passed on to the reducer or
+    written into a memory-mapped .npy file. The shared file and the json
+    format need the whole unit at once.
+
+    Inputs
+    ------
+    unit: A WorkUnit
+
+    T: The total number of timesteps. Optional
+
+    fmt: The output format, 'npy' or 'json'. See write_trajectories. Optional
+
+    writer: A SharedTrajectoryWriter. If given, the trajectories are written
+            to the shared file instead of a file of their own. Optional
+
+    reducer: A MomentSums. If given, the trajectories are added to it
+             instead of being written to disk. Optional
+
+    timeBlock: The number of timesteps generated at a time. Optional
+
+    resultCache: A cache.ResultCache. If it holds the result of the unit, the
+                 result is taken from it instead of being simulated. Otherwise
+                 the result is added to it. Trajectories are not cached in the
+                 json format (parse_args rejects --cache with it). Optional
+
+    pool: A concurrent.futures.ThreadPoolExecutor whose threads simulate the
+          sub-blocks of the unit, see simulate_unit. Optional
+
+    background: A BackgroundWriter. If given, the trajectories are written (and
+                stored in the cache) by its thread, after this returns. Optional
+
+    profile: A profiling.Profile, which the time spent in each phase of the
+             unit is added to. Optional
+
+    Returns
+    -------
+    hit: True if the result was taken from the cache. Writes the simulated
+         trajectories to disk.
+    '''
+
+    if profile is None:
+        profile = profiling.Profile()
+
+    if reducer is not None:
+        key = unit_cache_key(unit, T, 'sums') if resultCache is not None else None
+        with profile.phase('cache'):
+            cached = resultCache.load(key) if key is not None else None
+
+        if cached is not None:
+            unitSums = MomentSums(1, T)
+            unitSums.counts, unitSums.sums, unitSums.sumsq = cached['counts'], cached['sums'], cached['sumsq']
+            profile.add_bytes('cache', sum(value.nbytes for value in cached.values()))
+        else:
+            unitSums = unit_sums(unit, T, timeBlock, pool, profile)
+            if key is not None:
+                with profile.phase('cache'):
+                    resultCache.store(key, {'counts': unitSums.counts, 'sums': unitSums.sums,
+                                            'sumsq': unitSums.sumsq})
+
+        with profile.phase('reduce'):
+            reducer.merge(unit.index, unitSums)
+        return cached is not None
+
+    if fmt != 'npy':
+        resultCache = None
+    key = unit_cache_key(unit, T, 'trajectories') if resultCache is not None else None
+
+    if writer is not None or fmt != 'npy':
+        with profile.phase('cache'):
+            trajectories = resultCache.load(key) if key is not None else None
+        hit = trajectories is not None
+        if hit:
+            profile.add_bytes('cache', trajectories.nbytes)
+        else:
+            trajectories = np.empty((unit.numTrajectories, T), dtype=position_dtype(T))
+            unit_trajectories(unit, T, trajectories, timeBlock, pool, profile)
+
+        def write(writeProfile):
+            if not hit and key is not None:
+                with writeProfile.phase('cache'):
+                    resultCache.store(key, trajectories)
+
+            if writer is not None:
+                with writeProfile.phase('write'):
+                    writer.write(unit_name(unit), trajectories)
+                writeProfile.add_bytes('write', trajectories.nbytes)
+            else:
+                write_trajectories(unit_name(unit), unit.p, trajectories, seed=unit.seed,
+                                   block=unit.block, fmt=fmt, profile=writeProfile)
+
+        run_job(write, profile, background)
+        return hit
+
+    name = unit_name(unit)
+    data_path, meta_path = trajectory_io.chunk_paths('simulated_data', name)
+    shape = (unit.numTrajectories, T)
+
+    if key is not None:
+        #The metadata goes first, so that the chunk is complete as soon
+        #as the copy is renamed into place (on a miss, create_chunk
+        #writes the same metadata again)
+        with profile.phase('write'):
+            trajectory_io.write_chunk_meta('simulated_data', name, unit.p, unit.seed, shape,
+                                           position_dtype(T), block=unit.block)
+        with profile.phase('cache'):
+            hit = resultCache.copy_to(key, data_path)
+        if hit:
+            profile.add_bytes('cache', os.path.getsize(data_path))
+            return True
+
+    with profile.phase('write'):
+        trajectories = trajectory_io.create_chunk('simulated_data', name, unit.p, unit.seed, shape,
+                                                  position_dtype(T), block=unit.block)
+    unit_trajectories(unit, T, trajectories, timeBlock, pool, profile)
+
+    #The blocks were copied into the page cache of the
+    #memory map; flushing it is what writes them to disk
+    def write(writeProfile):
+        with writeProfile.phase('write'):
+            trajectories.flush()
+            writeProfile.add_bytes('write', trajectories.nbytes)
+            trajectory_io.commit_chunk('simulated_data', name)
+
+        if key is not None:
+            with writeProfile.phase('cache'):
+                resultCache.store_file(key, data_path)
+
+    run_job(write, profile, background)
+    return False
+
+def data_gen(units, rounds=None, manifest=None, **kwargs):
     r'''Generates trajectory data, and writes it to disk
 
     Inputs
     ----
-    ps: A numpy array or Python list of the values of $p$ to be iterated over
+    units: A list of the WorkUnits to be iterated over
+
+    rounds: The number of units handled by the busiest rank. When writing
+            collectively, ranks with fewer units take part in the remaining
+            writes without writing anything. Optional
+
+    manifest: A checkpoint.Manifest. Every unit is recorded in it once its
+              output is complete. Optional
+
+    The other keyword arguments (T, fmt, writer, reducer, timeBlock,
+    resultCache, pool, background, profile) are passed on to run_unit. The
+    profile also times the manifest ('checkpoint') and the idle collective
+    writes ('wait'). With a background writer, the units are recorded in the
+    manifest and the idle collective writes are made by its thread, in order,
+    so it must be closed before the manifest or the shared file.
 
     Returns
     ------
-    None. Writes the simulated trajectories to disk.
+    stats: A dictionary with the number of units and trajectories simulated,
+           the number of units taken from the cache ('cached'), and the time
+           in seconds spent simulating ('busy') and waiting for work ('wait').
+           Writes the simulated trajectories to disk.
     '''
 
-    comm = MPI.COMM_WORLD
+    stats = {'units': 0, 'trajectories': 0, 'cached': 0, 'busy': 0., 'wait': 0.}
 
-    rank = comm.Get_rank()
+    if kwargs.get('profile') is None:
+        kwargs['profile'] = profiling.Profile()
+    profile = kwargs['profile']
+    background = kwargs.get('background')
+
+    for unit in units:
+        start = time.time()
+        hit = run_unit(unit, **kwargs)
+        if manifest is not None:
+            run_job(checkpoint_job(manifest, unit), profile, background, holdsBuffer=False)
+        stats['busy'] += time.time() - start
+        stats['units'] += 1
+        stats['trajectories'] += unit.numTrajectories
+        stats['cached'] += int(hit)
+
+    writer = kwargs.get('writer')
+    if writer is not None and writer.collective and rounds is not None:
+        def skip(skipProfile):
+            with skipProfile.phase('wait'):
+                writer.skip()
+
+        for i in range(rounds - len(units)):
+            run_job(skip, profile, background, holdsBuffer=False)
+
+    return stats
+
+def checkpoint_job(manifest, unit):
+    r'''Returns a job (see run_job) recording unit in manifest'''
+
+    def record(checkpointProfile):
+        with checkpointProfile.phase('checkpoint'):
+            manifest.record(unit_name(unit))
+
+    return record
+
+def dynamic_master(comm, units):
+    r'''Hands out work units to the other ranks as they ask for them
+
+    Inputs
+    ------
+    comm: The MPI communicator. This function is run on rank 0.
+
+    units: A list of the WorkUnits to hand out
+
+    Returns
+    -------
+    None. Returns once every worker has been told to stop.
+    '''
+
+    queue = deque(units)
+    active = comm.Get_size() - 1
+    status = MPI.Status()
+
+    while active > 0:
+        comm.recv(source=MPI.ANY_SOURCE, tag=TAG_REQUEST, status=status)
+        worker = status.Get_source()
+
+        if queue:
+            comm.send(queue.popleft(), dest=worker, tag=TAG_WORK)
+        else:
+            #No work left, so tell the worker to stop
+            comm.send(None, dest=worker, tag=TAG_WORK)
+            active -= 1
+
+def dynamic_worker(comm, manifest=None, **kwargs):
+    r'''Asks rank 0 for work units, and simulates them until there are none left
+
+    Inputs
+    ------
+    comm: The MPI communicator
+
+    manifest: A checkpoint.Manifest, see data_gen. Optional
+
+    The other keyword arguments (T, fmt, writer, reducer, timeBlock, resultCache,
+    pool, background, profile) are passed on to run_unit. A writer must have
+    collective=False. See data_gen for the background writer.
+
+    Returns
+    -------
+    stats: A dictionary as returned by data_gen
+    '''
+
+    stats = {'units': 0, 'trajectories': 0, 'cached': 0, 'busy': 0., 'wait': 0.}
+
+    if kwargs.get('profile') is None:
+        kwargs['profile'] = profiling.Profile()
+    profile = kwargs['profile']
+    background = kwargs.get('background')
+
+    while True:
+        start = time.time()
+        with profile.phase('wait'):
+            comm.send(None, dest=0, tag=TAG_REQUEST)
+            unit = comm.recv(source=0, tag=TAG_WORK)
+        stats['wait'] += time.time() - start
+
+        if unit is None:
+            break
+
+        start = time.time()
+        hit = run_unit(unit, **kwargs)
+        if manifest is not None:
+            run_job(checkpoint_job(manifest, unit), profile, background, holdsBuffer=False)
+        stats['busy'] += time.time() - start
+        stats['units'] += 1
+        stats['trajectories'] += unit.numTrajectories
+        stats['cached'] += int(hit)
+
+    return stats
+
+def open_shared_writer(comm, units, T, collective):
+    r'''Lays out the shared trajectory file and opens it on every rank
+
+    Inputs
+    ------
+    comm: The MPI communicator
+
+    units: The list of all the WorkUnits on rank 0 (ignored on the other ranks)
+
+    T: The total number of timesteps
+
+    collective: Whether the writes will be collective, see SharedTrajectoryWriter
+
+    Returns
+    -------
+    (writer, index): The SharedTrajectoryWriter, and on rank 0 the index of the
+                     shared file (None on the other ranks)
+    '''
 
-    index = 0
-    for p in ps:
-        trajectories = multiple_trajectories(p, rank)
-        write_trajectories(rank, index, p, trajectories)
-        index += 1
+    dtype = position_dtype(T)
+
+    if comm.Get_rank() == 0:
+        entries = [{'name': unit_name(unit), 'p': unit.p, 'seed': unit.seed, 'block': unit.block,
+                    'numTrajectories': unit.numTrajectories} for unit in units]
+        index = trajectory_io.shared_layout(entries, T, dtype)
+
+        #Remove the index of an earlier run, so that the
+        #shared file is not read while it is being written
+        index_path = os.path.join('simulated_data', trajectory_io.SHARED_INDEX)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        layout = (trajectory_io.chunk_offsets(index), index['size'])
+    else:
+        index = None
+        layout = None
+
+    offsets, size = comm.bcast(layout, root=0)
+    writer = SharedTrajectoryWriter(comm, 'simulated_data', offsets, size, dtype, collective)
+
+    return writer, index
+
+def sweep_params(args):
+    r'''Returns the parameters which determine the output of a sweep
+
+    Inputs
+    ------
+    args: The options returned by parse_args
+
+    Returns
+    -------
+    params: A dictionary, see checkpoint.write_sweep
+    '''
+
+    return {'numPs': args.num_ps, 'T': args.T, 'numTrajectories': args.num_trajectories,
+            'blockSize': args.block_size, 'subBlock': args.sub_block, 'seed': args.seed,
+            'format': args.format, 'output': args.output, 'version': CACHE_VERSION}
+
+def resume_units(units, params, resume=False):
+    r'''Starts a new sweep, or works out which units are left to do in a resumed one
+
+    Inputs
+    ------
+    units: The list of all the WorkUnits of the sweep
+
+    params: The parameters of the sweep, see sweep_params
+
+    resume: If True, resume the sweep recorded in simulated_data. Otherwise
+            start a new one, discarding the manifests of any earlier sweep. Optional
+
+    Returns
+    -------
+    remaining: A list of the WorkUnits to simulate, or None if the sweep can't be
+               resumed because it was run with different parameters
+    '''
+
+    if not resume:
+        checkpoint.clear_manifests('simulated_data')
+        checkpoint.write_sweep('simulated_data', params)
+        return units
+
+    recorded = checkpoint.read_sweep('simulated_data')
+    if recorded != json.loads(json.dumps(params)):
+        print('Cannot resume: simulated_data holds a sweep with parameters {0}'.format(recorded))
+        return None
+
+    done = checkpoint.completed_units('simulated_data')
+    if params['output'] == 'files':
+        #Redo units whose output has gone missing since
+        ext = '.npy' if params['format'] == 'npy' else '.json'
+        done = set(name for name in done
+                   if os.path.exists(os.path.join('simulated_data', name + ext)))
+    else:
+        #The shared file is recreated (full of zeros) if it is gone, so
+        #if it is missing or cut short none of the units can be trusted
+        size = (sum(unit.numTrajectories for unit in units) * params['T'] *
+                position_dtype(params['T']).itemsize)
+        path = os.path.join('simulated_data', trajectory_io.SHARED_DATA)
+        if done and (not os.path.exists(path) or os.path.getsize(path) < size):
+            print('{0} is missing or incomplete: simulating every unit again'.format(path))
+            done = set()
+
+    remaining = [unit for unit in units if unit_name(unit) not in done]
+    print('Resuming: {0} of {1} units left to simulate'.format(len(remaining), len(units)))
+
+    return remaining
+
+def load_balance_report(all_stats):
+    r'''Prints how the work was spread over the ranks
+
+    Inputs
+    ------
+    all_stats: A list, indexed by rank, of the dictionaries returned
+               by data_gen or dynamic_worker
+
+    Returns
+    -------
+    None. Prints a table to screen.
+    '''
+
+    print('{0:>6} {1:>8} {2:>8} {3:>14} {4:>10} {5:>10}'.format(
+        'rank', 'units', 'cached', 'trajectories', 'busy (s)', 'wait (s)'))
+    for rank, stats in enumerate(all_stats):
+        print('{0:>6} {1:>8} {2:>8} {3:>14} {4:>10.3f} {5:>10.3f}'.format(
+            rank, stats['units'], stats['cached'], stats['trajectories'], stats['busy'], stats['wait']))
+
+    busy = [stats['busy'] for stats in all_stats if stats['units'] > 0]
+    if busy and np.mean(busy) > 0:
+        print('Load imbalance (max busy / mean busy): {0:.3f}'.format(max(busy) / np.mean(busy)))
+
+def write_exact_summary(ps, T=100, plot=False):
+    r'''Writes the exact mean and variance for each value of p to disk
+
+    Inputs
+    ------
+    ps: A numpy array or Python list of the values of $p$
+
+    T: The total number of timesteps. Optional
+
+    plot: If True, also plot the mean displacement. Optional
+
+    Returns
+    -------
+    None. Writes simulated_data/summary.npz.
+    '''
+
+    moments = [exact.exact_moments(p, T) for p in ps]
+    mean = np.array([m[0] for m in moments])
+    var = np.array([m[1] for m in moments])
+
+    trajectory_io.write_summary('simulated_data', ps, mean, var)
+
+    if plot:
+        import plotter
+        plotter.make_plot('simulated_data')
+
+def validation_report(ps, counts, mean, var):
+    r'''Prints how the simulated mean and variance compare with the exact values
+
+    Inputs
+    ------
+    ps, counts, mean, var: As for exact.validate
+
+    Returns
+    -------
+    passed: True if the validation passed. Prints a table to screen.
+    '''
+
+    passed, report = exact.validate(ps, counts, mean, var)
+
+    print('{0:>8} {1:>12} {2:>12}'.format('p', 'max |z| mean', 'max |z| var'))
+    for p, z_mean, z_var in report:
+        print('{0:>8.3f} {1:>12.3f} {2:>12.3f}'.format(p, z_mean, z_var))
+    print('Validation {0}'.format('passed' if passed else 'FAILED'))
+
+    return passed
 
 def chunks(l, numChunks):
     r"""Yield numChunks chunks from l.
 
     If the number of chunks doesn't evenly divide
-    the length of l, this function will return
-    (numChunks - 1) chunks of the same length,
-    and one chunk whose length is longer.
+    the length of l, the first chunks are one element
+    longer than the others. The lengths never differ
+    by more than one, so even a list shorter than
+    numChunks (e.g. the units left to resume) is
+    spread over the chunks.
 
     Inputs
     ------
@@ -135,15 +1136,101 @@ def chunks(l, numChunks):
     --------
     A generator object which yields chunks from l.
     """
-    chunkSize = int(np.floor(len(l) / numChunks))
+    chunkSize, extra = divmod(len(l), numChunks)
+    start = 0
     for i in range(0, numChunks):
-        if i < numChunks - 1:
-            yield l[i * chunkSize :(i + 1) * chunkSize]
-        else:
-            yield l[i * chunkSize:]
+        end = start + chunkSize + (1 if i < extra else 0)
+        yield l[start:end]
+        start = end
+
+def parse_args():
+    r'''Parses the command line arguments of the simulator
+
+    Returns
+    -------
+    args: An argparse.Namespace holding the options
+    '''
+
+    parser = argparse.ArgumentParser(description='Simulates biased random walks with MPI')
+    parser.add_argument('--format', choices=['npy', 'json'], default='npy',
+                        help='Output format for the trajectories (default: npy)')
+    parser.add_argument('--num-ps', type=int, default=11,
+                        help='Number of values of p, evenly spaced in [0, 1] (default: 11)')
+    parser.add_argument('-T', type=int, default=100,
+                        help='Number of timesteps (default: 100)')
+    parser.add_argument('--num-trajectories', type=int, default=100,
+                        help='Number of trajectories for each value of p (default: 100)')
+    parser.add_argument('--time-block', type=int, default=1024,
+                        help='Number of timesteps generated at a time. Bounds the memory '
+                             'used per work unit, without changing the results (default: 1024)')
+    parser.add_argument('--block-size', type=int, default=None,
+                        help='Maximum number of trajectories in a work unit '
+                             '(default: all the trajectories of one p)')
+    parser.add_argument('--sub-block', type=int, default=SUB_BLOCK,
+                        help='Number of trajectories drawn from one random stream. The '
+                             'sub-blocks of a work unit are simulated in parallel by the '
+                             'threads of a rank (default: {0})'.format(SUB_BLOCK))
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Number of threads simulating the sub-blocks of a work unit on '
+                             'each rank. Does not change the results, so a node can run one '
+                             'rank with many threads instead of many ranks (default: 1)')
+    parser.add_argument('--write-queue', type=int, default=0,
+                        help='Number of simulated work units which may wait to be written by a '
+                             'background thread while the next ones are simulated. 1 is double '
+                             'buffering. 0 writes every unit before simulating the next (default: 0)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Root seed of the sweep. The random stream of every (p, block) '
+                             'work unit is derived from it (default: 0)')
+    parser.add_argument('--cache', default=None,
+                        help='Directory of a cache of work unit results. Units whose result '
+                             'is in the cache are not simulated again (default: no cache)')
+    parser.add_argument('--cache-size', type=float, default=1024,
+                        help='Largest size of the cache in MB. The least recently used '
+                             'results are evicted first (default: 1024)')
+    parser.add_argument('--output', choices=['files', 'shared'], default='files',
+                        help='files: one file per work unit. shared: all ranks write into '
+                             'one shared file with MPI-IO, plus an index (default: files)')
+    parser.add_argument('--reduce', action='store_true',
+                        help='Do not write trajectories. Instead, combine the per-timestep sums '
+                             'and sums of squares for each p on rank 0, which writes them to '
+                             'simulated_data/summary.npz')
+    parser.add_argument('--plot', action='store_true',
+                        help='With --reduce or --exact, also plot the mean displacement on rank 0')
+    parser.add_argument('--validate', action='store_true',
+                        help='With --reduce, check the mean and variance against the exact values')
+    parser.add_argument('--exact', action='store_true',
+                        help='Do not simulate. Instead, rank 0 writes the exact mean and variance '
+                             'for each p to simulated_data/summary.npz')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted sweep with the same parameters, '
+                             'simulating only the work units not yet completed')
+    parser.add_argument('--schedule', choices=['static', 'dynamic'], default='static',
+                        help='static: scatter the work units once. dynamic: rank 0 hands '
+                             'out work units as the other ranks finish them (default: static)')
+
+    args = parser.parse_args()
+    if args.output == 'shared' and args.format != 'npy':
+        parser.error('--output shared only supports the npy format')
+    if args.cache is not None and args.format != 'npy' and not args.reduce:
+        parser.error('--cache only supports the npy format')
+    if args.threads < 1 or args.sub_block < 1:
+        parser.error('--threads and --sub-block must be at least 1')
+    if args.write_queue < 0:
+        parser.error('--write-queue must be at least 0')
+    if args.plot and not (args.reduce or args.exact):
+        parser.error('--plot requires --reduce or --exact')
+    if args.validate and not args.reduce:
+        parser.error('--validate requires --reduce')
+    if args.resume and args.reduce:
+        parser.error('--resume cannot be used with --reduce, whose sums are only '
+                     'kept in memory. Use --cache instead.')
+
+    return args
 
 def main():
 
+    args = parse_args()
+
     #Instantiate MPI.COMM_WORLD,
     #and use Get_rank(), Get_size()
     #to get rank and size.
@@ -152,24 +1239,168 @@ def main():
     size = comm.Get_size()
 
     #Conditional logic - if the rank is 0,
-    #generate a list of values for p,
-    #shuffle them, and then chunk.
-    #If rank is not zero, set values of p to "None"
+    #split the values of p into units of work.
+    #If rank is not zero, set units to "None"
+    ps = list(np.round(np.linspace(0, 1, args.num_ps), 10))
+
+    #The moments are known exactly, so
+    #there is nothing to simulate
+    if args.exact:
+        if rank == 0:
+            write_exact_summary(ps, args.T, plot=args.plot)
+        return
+
     if rank == 0:
-        ps = [0, .1, .2, .3, .4, .5, .6, .7, .8, .9, 1]
-        np.random.shuffle(ps)
+        units = work_units(ps, args.num_trajectories, args.block_size, args.seed, args.sub_block)
+    else:
+        units = None
+
+    #Keep track of the completed units, so that the sweep
+    #can be resumed if it is interrupted. A resumed run
+    #only hands out the units which are not done yet
+    #(but the shared file is still laid out for all of them).
+    if not args.reduce:
+        remaining = resume_units(units, sweep_params(args), args.resume) if rank == 0 else None
+        if not comm.bcast(remaining is not None, root=0):
+            return
+        manifest = checkpoint.Manifest('simulated_data', rank)
+    else:
+        remaining = units
+        manifest = None
+
+    dynamic = args.schedule == 'dynamic' and size > 1
+
+    #For shared output, every rank opens the same file,
+    #and writes its units at offsets computed on rank 0.
+    #Units arrive in an unpredictable order with the
+    #dynamic schedule, so the writes can't be collective.
+    if args.output == 'shared' and not args.reduce:
+        writer, index = open_shared_writer(comm, units, args.T, collective=not dynamic)
+    else:
+        writer, index = None, None
+
+    #In reduce mode, the trajectories are only added up
+    reducer = MomentSums(len(ps), args.T) if args.reduce else None
+
+    if args.cache is not None:
+        resultCache = cache.ResultCache(args.cache, int(args.cache_size * 2**20))
+    else:
+        resultCache = None
+
+    #The sub-blocks of every unit are shared out
+    #between the threads of this rank
+    pool = ThreadPoolExecutor(max_workers=args.threads) if args.threads > 1 else None
+
+    #Write the output of every unit in the background while
+    #the next is simulated. A writer thread making MPI-IO calls
+    #needs MPI to be thread safe, fully so with the dynamic
+    #schedule, where the main thread is talking to rank 0.
+    required = MPI.THREAD_MULTIPLE if dynamic else MPI.THREAD_SERIALIZED
+    if args.write_queue > 0 and not args.reduce and (writer is None or MPI.Query_thread() >= required):
+        background = BackgroundWriter(args.write_queue)
+    else:
+        if args.write_queue > 0 and not args.reduce and rank == 0:
+            print('MPI is not thread safe enough to write the shared file in the background')
+        background = None
+
+    #Time every phase of the work on this rank.
+    #The profiles are gathered on rank 0 at the end.
+    profile = profiling.Profile()
+
+    unitOptions = {'T': args.T, 'fmt': args.format, 'writer': writer, 'reducer': reducer,
+                   'timeBlock': args.time_block, 'resultCache': resultCache, 'manifest': manifest,
+                   'pool': pool, 'background': background, 'profile': profile}
 
-        ps = chunks(ps, size)
+    #Statistics from an earlier reduce run would be
+    #read by the plotter in place of the new trajectories
+    summary_path = os.path.join('simulated_data', trajectory_io.SUMMARY)
+    if rank == 0 and not args.reduce and os.path.exists(summary_path):
+        os.remove(summary_path)
+
+    #Chunks of the other format, left by an earlier sweep,
+    #would be read along with (or in place of) the new ones,
+    #and so would a shared file from an earlier --output shared
+    #run, which iter_chunks reads in place of the chunk files
+    if rank == 0 and not args.reduce and args.output == 'files':
+        trajectory_io.remove_chunks('simulated_data', 'json' if args.format == 'npy' else 'npy')
+        for name in [trajectory_io.SHARED_INDEX, trajectory_io.SHARED_DATA]:
+            path = os.path.join('simulated_data', name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    if dynamic:
+        #Rank 0 only hands out work. The other ranks
+        #ask it for a new unit whenever they finish one.
+        if rank == 0:
+            start = time.time()
+            with profile.phase('schedule'):
+                dynamic_master(comm, remaining)
+            stats = {'units': 0, 'trajectories': 0, 'cached': 0, 'busy': 0., 'wait': time.time() - start}
+        else:
+            stats = dynamic_worker(comm, **unitOptions)
     else:
-        ps = None
+        #Shuffle the units and chunk them on rank 0,
+        #then use the scatter() method to scatter
+        #the chunks (set root=0)
+        if rank == 0:
+            np.random.shuffle(remaining)
+            remaining = chunks(remaining, size)
+
+        my_units = comm.scatter(remaining, root=0)
+        rounds = comm.allreduce(len(my_units), op=MPI.MAX)
+
+        #Now, call data_gen!
+        stats = data_gen(my_units, rounds=rounds, **unitOptions)
+
+    if pool is not None:
+        pool.shutdown()
 
-    #Use the scatter() method to scatter the chunks
-    #(set root=0) and set them to be some local variable
-    my_ps = comm.scatter(ps, root=0)
+    #Wait for the last units to be written
+    if background is not None:
+        with profile.phase('wait'):
+            background.close()
+        profile.merge(background.profile)
 
-    #Now, call data_gen!
-    data_gen(my_ps)
+    if manifest is not None:
+        with profile.phase('checkpoint'):
+            manifest.close()
+
+    if writer is not None:
+        with profile.phase('write'):
+            writer.close()
+        if rank == 0:
+            trajectory_io.write_shared_index('simulated_data', index)
+
+    #Combine the sums of all the ranks on rank 0,
+    #which writes only the statistics to disk
+    if reducer is not None:
+        with profile.phase('reduce'):
+            total = reducer.reduce(comm, root=0)
+        if rank == 0:
+            mean, var = total.moments()
+            with profile.phase('write'):
+                trajectory_io.write_summary('simulated_data', ps, mean, var, counts=total.counts,
+                                            sums=total.sums, sumsq=total.sumsq)
+            if args.validate:
+                validation_report(ps, total.counts, mean, var)
+            if args.plot:
+                with profile.phase('plot'):
+                    import plotter
+                    plotter.make_plot('simulated_data')
+
+    #Report how the work was spread over the ranks
+    #(The profile is taken first, so that it doesn't
+    #count the time spent waiting for the other ranks)
+    profileData = profile.as_dict()
+    all_stats = comm.gather(stats, root=0)
+    all_profiles = comm.gather(profileData, root=0)
+    if rank == 0:
+        load_balance_report(all_stats)
+
+        #Write where the time went on each rank next to the data
+        report = profiling.summarize(all_profiles)
+        profiling.print_report(report)
+        print('Profile written to {0}'.format(profiling.write_report('simulated_data', report)))
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,85 @@
+import numpy as np
+
+#Number of steps made from one raw 64-bit random word when p = 0.5
+BITS_PER_WORD = 64
+
+class StepDrawer(object):
+    r'''Draws the +1/-1 steps of a random walk straight into an int8 array
+
+    For p = 0.5 every random bit is a step, so the steps are unpacked from
+    the raw 64-bit words of the bit generator, 64 steps per word. For other
+    values of p a step is +1 if a float32 uniform draw is below p (so p is
+    resolved to about 1e-7). Either way the only temporaries are the random
+    words (1 bit or 4 bytes per step), rather than the int64 draws of
+    np.random.binomial and the passes of convert_value.
+
+    Steps are taken from the random stream in order, and bits left over
+    from the last word are kept for the next call, so drawing n and then m
+    steps gives the same steps as drawing n + m at once.
+
+    Inputs
+    ------
+    rng: The numpy.random.Generator to draw from
+
+    p: The probability of a +1 step
+    '''
+
+    def __init__(self, rng, p):
+        self.rng = rng
+        self.p = p
+        self.fair = (p == 0.5)
+        self.threshold = np.float32(p)
+
+        #Steps unpacked from the last word but not handed out yet
+        self.leftover = np.empty(0, dtype=np.int8)
+
+    def draw(self, n, out=None):
+        r'''Draws n steps
+
+        Inputs
+        ------
+        n: The number of steps
+
+        out: An int8 array of n elements to write the steps into. Optional
+
+        Returns
+        -------
+        out: An int8 numpy array holding n steps, each +1 or -1
+        '''
+
+        if out is None:
+            out = np.empty(n, dtype=np.int8)
+        flat = out.reshape(-1)
+
+        if self.fair:
+            self._draw_bits(n, flat)
+        else:
+            uniform = self.rng.random(n, dtype=np.float32)
+            np.less(uniform, self.threshold, out=flat)
+
+            #True/False -> +1/-1, in place
+            flat *= 2
+            flat -= 1
+
+        return out
+
+    def _draw_bits(self, n, flat):
+        #Steps still left over from the last word come first
+        k = min(n, len(self.leftover))
+        flat[:k] = self.leftover[:k]
+        self.leftover = self.leftover[k:]
+        if k == n:
+            return
+
+        #Whole words, in a fixed byte order so that the steps
+        #are the same on every machine
+        words = -(-(n - k) // BITS_PER_WORD)
+        raw = self.rng.bit_generator.random_raw(words).astype('<u8', copy=False)
+        bits = np.unpackbits(raw.view(np.uint8)).view(np.int8)
+
+        #1/0 -> +1/-1, in place
+        bits *= 2
+        bits -= 1
+
+        flat[k:] = bits[:n - k]
+        self.leftover = bits[n - k:]
@@ -0,0 +1,483 @@
+import os
+import re
+import glob
+import json
+import numpy as np
+
+#File names of the shared trajectory file and its index
+SHARED_DATA = 'trajectories.bin'
+SHARED_INDEX = 'trajectories.index.json'
+
+#File name of the per-timestep statistics written in reduce mode
+SUMMARY = 'summary.npz'
+
+#File name of the timing report of the simulator (see profiling.py)
+PROFILE = 'profile.json'
+
+#Names of the chunks of trajectories, <index>-<block> (see simulator.unit_name)
+CHUNK_NAME = re.compile(r'^\d+-\d+$')
+
+def temporary_path(path):
+    r'''Returns the path a file is written to before being renamed to path
+
+    All the files are first written under this name, and then renamed
+    with os.replace (see commit). A file is therefore either complete
+    or absent, even if the writing process dies. The temporary names
+    don't match the patterns the readers look for.
+    '''
+
+    return path + '.tmp'
+
+def commit(path):
+    r'''Renames the temporary file of path (see temporary_path) to path'''
+
+    os.replace(temporary_path(path), path)
+
+def chunk_paths(directory, name):
+    r'''Returns the paths of the files making up one chunk of trajectories
+
+    Inputs
+    ------
+    directory: The directory holding the simulated data
+
+    name: The name of the chunk, e.g. "rank-index"
+
+    Returns
+    -------
+    (data_path, meta_path): The path of the raw .npy array and the
+                            path of its metadata header
+    '''
+
+    base = os.path.join(directory, name)
+    return base + '.npy', base + '.meta.json'
+
+def write_chunk(directory, name, p, seed, trajectories, block=None):
+    r'''Writes a chunk of trajectories to disk in the binary format
+
+    The trajectories are stored as a raw .npy array (which can be
+    memory-mapped when reading), next to a small json header
+    recording p, the seed, the block number, T and the dtype.
+
+    Inputs
+    ------
+    directory: The directory to write to
+
+    name: The name of the chunk, e.g. "rank-index"
+
+    p: The value of $p$ used to simulate the trajectories
+
+    seed: The seed used to simulate the trajectories
+
+    trajectories: A numpy array of shape (numTrajectories, T)
+
+    block: The block number of the trajectories. Optional
+
+    Returns
+    -------
+    None. Writes "name.npy" and "name.meta.json" to directory.
+    '''
+
+    trajectories = np.asarray(trajectories)
+    data_path, meta_path = chunk_paths(directory, name)
+
+    with open(temporary_path(data_path), 'wb') as f:
+        np.save(f, trajectories)
+
+    #The metadata is written first, so that a chunk
+    #is complete as soon as its .npy file exists
+    write_chunk_meta(directory, name, p, seed, trajectories.shape, trajectories.dtype, block=block)
+    commit(data_path)
+
+def write_chunk_meta(directory, name, p, seed, shape, dtype, block=None):
+    r'''Writes the metadata header of a chunk of trajectories
+
+    Inputs
+    ------
+    directory: The directory to write to
+
+    name: The name of the chunk, e.g. "index-block"
+
+    p: The value of $p$ used to simulate the trajectories
+
+    seed: The seed used to simulate the trajectories
+
+    shape: The shape (numTrajectories, T) of the trajectories
+
+    dtype: The numpy dtype of the trajectories
+
+    block: The block number of the trajectories. Optional
+
+    Returns
+    -------
+    None. Writes "name.meta.json" to directory.
+    '''
+
+    data_path, meta_path = chunk_paths(directory, name)
+
+    meta = {'p': float(p),
+            'seed': seed,
+            'block': block,
+            'T': int(shape[1]),
+            'numTrajectories': int(shape[0]),
+            'dtype': np.dtype(dtype).str}
+    with open(temporary_path(meta_path), 'w') as f:
+        json.dump(meta, f)
+    commit(meta_path)
+
+def create_chunk(directory, name, p, seed, shape, dtype, block=None):
+    r'''Creates a chunk of trajectories in the binary format, to be filled in place
+
+    This is write_chunk for trajectories which are generated piece by piece:
+    the .npy file is created at its full size, under its temporary name,
+    and returned memory-mapped. Once filled in, it is moved into place
+    with commit_chunk.
+
+    Inputs
+    ------
+    directory: The directory to write to
+
+    name: The name of the chunk, e.g. "index-block"
+
+    p: The value of $p$ used to simulate the trajectories
+
+    seed: The seed used to simulate the trajectories
+
+    shape: The shape (numTrajectories, T) of the trajectories
+
+    dtype: The numpy dtype of the trajectories
+
+    block: The block number of the trajectories. Optional
+
+    Returns
+    -------
+    trajectories: A writable numpy memmap of the given shape and dtype. Call its
+                  flush() method, and then commit_chunk, once it has been filled in.
+    '''
+
+    data_path, meta_path = chunk_paths(directory, name)
+
+    trajectories = np.lib.format.open_memmap(temporary_path(data_path), mode='w+',
+                                             dtype=dtype, shape=shape)
+    write_chunk_meta(directory, name, p, seed, shape, dtype, block=block)
+
+    return trajectories
+
+def commit_chunk(directory, name):
+    r'''Moves a chunk made by create_chunk into place, once it has been filled in'''
+
+    data_path, meta_path = chunk_paths(directory, name)
+    commit(data_path)
+
+def encode_json_chunk(p, trajectories):
+    r'''Returns the text of a chunk of trajectories in the json format
+
+    Inputs
+    ------
+    p: The value of $p$ used to simulate the trajectories
+
+    trajectories: A numpy array (or Python list) of shape (numTrajectories, T)
+
+    Returns
+    -------
+    text: A string, to be written to disk with write_json_text
+    '''
+
+    trajectories = [[str(x) for x in trajectory] for trajectory in trajectories]
+
+    d = {'p': p, 'trajectories' : trajectories}
+    return json.dumps(d)
+
+def write_json_text(directory, name, text):
+    r'''Writes the text made by encode_json_chunk to "name.json" in directory'''
+
+    path = os.path.join(directory, name + '.json')
+    with open(temporary_path(path), 'w') as f:
+        f.write(text)
+    commit(path)
+
+def read_chunk(path, mmap=True):
+    r'''Reads a chunk of trajectories written by write_chunk or write_json_text
+
+    Inputs
+    ------
+    path: The path of the .npy or .json file
+
+    mmap: If True, binary chunks are memory-mapped rather than read into memory
+
+    Returns
+    -------
+    (meta, trajectories): meta is a dictionary holding at least the key 'p',
+                          trajectories is a numpy array of shape (numTrajectories, T)
+    '''
+
+    if path.endswith('.npy'):
+        with open(path[:-len('.npy')] + '.meta.json', 'r') as f:
+            meta = json.load(f)
+        trajectories = np.load(path, mmap_mode='r' if mmap else None)
+    else:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        trajectories = np.int_(data['trajectories'])
+        meta = {'p': data['p'],
+                'T': int(trajectories.shape[1]),
+                'numTrajectories': int(trajectories.shape[0]),
+                'dtype': trajectories.dtype.str}
+
+    return meta, trajectories
+
+def list_chunks(directory):
+    r'''Lists the chunks of trajectories stored in a directory
+
+    Binary chunks are preferred; a json file is only listed if there
+    is no binary chunk of the same name.
+
+    Inputs
+    ------
+    directory: The directory holding the simulated data
+
+    Returns
+    -------
+    paths: A sorted list of paths which can be passed to read_chunk
+    '''
+
+    def chunks(ext):
+        #Only files named like chunks, <index>-<block>.<ext>, so that the
+        #metadata, index and reports kept alongside them are never listed
+        return [path for path in glob.glob(os.path.join(directory, '*' + ext))
+                if CHUNK_NAME.match(os.path.basename(path)[:-len(ext)])]
+
+    paths = chunks('.npy')
+    binary_names = set(path[:-len('.npy')] for path in paths)
+
+    for path in chunks('.json'):
+        if path[:-len('.json')] not in binary_names:
+            paths.append(path)
+
+    return sorted(paths)
+
+def remove_chunks(directory, fmt):
+    r'''Deletes the chunks of trajectories stored in one format
+
+    list_chunks prefers binary chunks to json chunks of the same name, so
+    the chunks of the other format are deleted when a sweep starts.
+
+    Inputs
+    ------
+    directory: The directory holding the simulated data
+
+    fmt: The format of the chunks to delete, 'npy' or 'json'
+
+    Returns
+    -------
+    None. Deletes the chunk files (and the headers of binary chunks).
+    '''
+
+    ext = '.' + fmt
+    for path in glob.glob(os.path.join(directory, '*' + ext)):
+        name = os.path.basename(path)[:-len(ext)]
+        if not CHUNK_NAME.match(name):
+            continue
+        os.remove(path)
+        if fmt == 'npy':
+            data_path, meta_path = chunk_paths(directory, name)
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+
+def iter_chunks(directory, mmap=True, rank=0, size=1):
+    r'''Iterates over the chunks of trajectories stored in a directory
+
+    If the directory holds a shared trajectory file (see read_shared),
+    only the chunks listed in its index are read. Otherwise the
+    individual chunk files are read.
+
+    Inputs
+    ------
+    directory: The directory holding the simulated data
+
+    mmap: If True, binary chunks are memory-mapped rather than read into memory
+
+    rank, size: Only every size^th chunk is read, starting from the rank^th, so
+                that size processes can share out the chunks. Optional
+
+    Returns
+    -------
+    A generator object which yields (meta, trajectories) for every chunk
+    '''
+
+    if os.path.exists(os.path.join(directory, SHARED_INDEX)):
+        for chunk in read_shared(directory, mmap=mmap, rank=rank, size=size):
+            yield chunk
+        return
+
+    for path in list_chunks(directory)[rank::size]:
+        yield read_chunk(path, mmap=mmap)
+
+def shared_layout(entries, T, dtype):
+    r'''Computes where each chunk of trajectories goes in a shared trajectory file
+
+    The chunks are laid out back to back, in the order given, each as a
+    row-major array of shape (numTrajectories, T).
+
+    Inputs
+    ------
+    entries: A list of dictionaries, one per chunk, with the keys
+             'name', 'p', 'seed', 'block' and 'numTrajectories'
+
+    T: The number of timesteps of every trajectory
+
+    dtype: The numpy dtype of the trajectories
+
+    Returns
+    -------
+    index: A dictionary describing the shared file. index['ps'] lists, for
+           every value of p (in order of first appearance), the chunks holding
+           its trajectories, each with the byte offset at which the chunk starts.
+    '''
+
+    dtype = np.dtype(dtype)
+    index = {'data': SHARED_DATA, 'T': int(T), 'dtype': dtype.str, 'ps': []}
+    groups = {}
+
+    offset = 0
+    for entry in entries:
+        p = float(entry['p'])
+        if p not in groups:
+            groups[p] = {'p': p, 'chunks': []}
+            index['ps'].append(groups[p])
+
+        groups[p]['chunks'].append({'name': entry['name'],
+                                    'seed': entry['seed'],
+                                    'block': entry['block'],
+                                    'offset': offset,
+                                    'numTrajectories': int(entry['numTrajectories'])})
+        offset += int(entry['numTrajectories']) * int(T) * dtype.itemsize
+
+    index['size'] = offset
+
+    return index
+
+def chunk_offsets(index):
+    r'''Returns a dictionary mapping the name of each chunk to its byte offset
+    in the shared file described by index (see shared_layout)'''
+
+    return dict((chunk['name'], chunk['offset'])
+                for group in index['ps'] for chunk in group['chunks'])
+
+def write_shared_index(directory, index):
+    r'''Writes the index of a shared trajectory file to disk
+
+    Inputs
+    ------
+    directory: The directory holding the shared file
+
+    index: The dictionary returned by shared_layout
+
+    Returns
+    -------
+    None. Writes SHARED_INDEX to directory.
+    '''
+
+    path = os.path.join(directory, SHARED_INDEX)
+    with open(temporary_path(path), 'w') as f:
+        json.dump(index, f)
+    commit(path)
+
+def read_shared(directory, mmap=True, rank=0, size=1):
+    r'''Iterates over the chunks of trajectories in a shared trajectory file
+
+    Inputs
+    ------
+    directory: The directory holding the shared file and its index
+
+    mmap: If True, the chunks are memory-mapped rather than read into memory
+
+    rank, size: Only every size^th chunk of the index is read, starting
+                from the rank^th, see iter_chunks. Optional
+
+    Returns
+    -------
+    A generator object which yields (meta, trajectories) for every chunk
+    '''
+
+    with open(os.path.join(directory, SHARED_INDEX), 'r') as f:
+        index = json.load(f)
+
+    path = os.path.join(directory, index['data'])
+    dtype = np.dtype(index['dtype'])
+    T = index['T']
+
+    chunks = [(group, chunk) for group in index['ps'] for chunk in group['chunks']]
+
+    for group, chunk in chunks[rank::size]:
+        shape = (chunk['numTrajectories'], T)
+        if mmap:
+            trajectories = np.memmap(path, dtype=dtype, mode='r',
+                                     offset=chunk['offset'], shape=shape)
+        else:
+            with open(path, 'rb') as f:
+                f.seek(chunk['offset'])
+                trajectories = np.fromfile(f, dtype=dtype, count=shape[0] * T).reshape(shape)
+
+        meta = {'p': group['p'], 'seed': chunk['seed'], 'block': chunk['block'], 'T': T,
+                'numTrajectories': shape[0], 'dtype': index['dtype']}
+        yield meta, trajectories
+
+def write_summary(directory, ps, mean, var, counts=None, sums=None, sumsq=None):
+    r'''Writes the per-timestep statistics of a sweep to disk
+
+    Inputs
+    ------
+    directory: The directory to write to
+
+    ps: A numpy array of the values of $p$, of length numPs
+
+    mean: A numpy array of shape (numPs, T), holding for each p the mean
+          displacement at each timestep
+
+    var: A numpy array of shape (numPs, T), holding the variance of the displacement
+
+    counts: A numpy array holding the number of trajectories for each p.
+            Leave out for exact results. Optional
+
+    sums: A numpy array of shape (numPs, T), holding for each p the sum
+          over trajectories of the displacement at each timestep. Optional
+
+    sumsq: A numpy array of shape (numPs, T), holding the sums of the
+           squared displacements. Optional
+
+    Returns
+    -------
+    None. Writes SUMMARY to directory, which is created if needed.
+    '''
+
+    arrays = {'p': np.asarray(ps, dtype=np.float64), 'mean': mean, 'var': var}
+    for key, value in [('count', counts), ('sum', sums), ('sumsq', sumsq)]:
+        if value is not None:
+            arrays[key] = value
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, SUMMARY)
+    with open(temporary_path(path), 'wb') as f:
+        np.savez(f, **arrays)
+    commit(path)
+
+def read_summary(directory):
+    r'''Reads the statistics written by write_summary
+
+    Inputs
+    ------
+    directory: The directory holding the simulated data
+
+    Returns
+    -------
+    summary: A dictionary of numpy arrays with the keys 'p', 'mean' and 'var',
+             and 'count', 'sum' and 'sumsq' if they were written
+    '''
+
+    with np.load(os.path.join(directory, SUMMARY)) as data:
+        return dict((key, data[key]) for key in data.files)
+
+def has_summary(directory):
+    r'''Returns True if directory holds statistics written by write_summary'''
+
+    return os.path.exists(os.path.join(directory, SUMMARY))